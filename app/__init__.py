@@ -1,7 +1,26 @@
+import atexit
+from datetime import timedelta
 from flask import Flask
 from app.config import load_configurations, configure_logging
 from .views import webhook_blueprint
-from app.database import ScheduleManager
+from app.database import get_manager
+from app.decorators.security import SignatureVerifier
+from app.utils.dedup import MessageDeduplicator
+from app.utils.graph_client import GraphAPIClient
+from app.utils.metrics import CACHE_EVENTS, DB_POOL, OUTBOUND_QUEUE, WEBHOOK_QUEUE
+from app.utils.outbound import OutboundDispatcher
+from app.utils.reminder_scheduler import ReminderScheduler
+from app.utils import tracing
+from app.utils.webhook_queue import WebhookWorkerPool
+from app.utils.whatsapp_utils import get_text_message_input, process_schedule_data, process_whatsapp_messages
+
+def _manager_stats(app, read):
+    # scrape-time gauge values; empty until something has created the manager
+    manager = app.extensions.get("schedule_manager")
+    if manager is None:
+        return {}
+    return {(key,): value for key, value in read(manager).items()}
+
 
 def create_app():
     app = Flask(__name__)
@@ -9,9 +28,65 @@ def create_app():
     # Load configurations and logging settings
     load_configurations(app)
     configure_logging()
+    tracing.configure(app.config["TRACE_FILE"], app.config["TRACE_PROFILE_MS"], app.config["TRACE_PROFILE_INTERVAL_MS"])
 
     # load function
     app.register_blueprint(webhook_blueprint)
-    ScheduleManager().__init__()
+    # nothing here touches the database: the manager is built on first use and
+    # its pool connects on the first query; the schema comes from `python -m app.migrate`
+    app.extensions["graph_client"] = GraphAPIClient.from_config(app.config)
+    app.extensions["signature_verifier"] = SignatureVerifier(app.config["APP_SECRETS"])
+    CACHE_EVENTS.set_function(lambda: _manager_stats(app, lambda m: m.range_cache.stats()))
+    DB_POOL.set_function(lambda: _manager_stats(app, lambda m: {"open": m.pool.size, "idle": m.pool.idle}))
+    app.extensions["dedup"] = MessageDeduplicator(
+        max_size=app.config["DEDUP_MAX_SIZE"],
+        ttl=app.config["DEDUP_TTL"],
+        store=get_manager(app) if app.config["DEDUP_PERSISTENT"] else None,
+    )
+
+    outbound = OutboundDispatcher(
+        app.extensions["graph_client"],
+        get_text_message_input,
+        store=get_manager(app),
+        rate=app.config["OUTBOUND_RATE"],
+        burst=app.config["OUTBOUND_BURST"],
+        recipient_rate=app.config["OUTBOUND_RECIPIENT_PER_MINUTE"] / 60,
+        recipient_burst=app.config["OUTBOUND_RECIPIENT_BURST"],
+        coalesce_window=app.config["OUTBOUND_COALESCE_MS"] / 1000,
+        workers=app.config["OUTBOUND_WORKERS"],
+        max_age=timedelta(hours=app.config["OUTBOUND_MAX_AGE_HOURS"]),
+    )
+    app.extensions["outbound"] = outbound
+    OUTBOUND_QUEUE.set_function(lambda: {(state,): value for state, value in outbound.stats().items()})
+    if app.config["OUTBOUND_ASYNC"]:
+        outbound.start()
+        # registered first so it runs last, after the webhook workers and scheduler have queued their replies
+        atexit.register(outbound.stop)
+
+    if app.config["WEBHOOK_ASYNC"]:
+        workers = WebhookWorkerPool(
+            app,
+            process_whatsapp_messages,
+            workers=app.config["WEBHOOK_WORKERS"],
+            max_queue=app.config["WEBHOOK_QUEUE_SIZE"],
+        )
+        app.extensions["webhook_workers"] = workers
+        WEBHOOK_QUEUE.set_function(lambda: {(state,): value for state, value in workers.stats().items()})
+        atexit.register(workers.shutdown, app.config["WEBHOOK_DRAIN_TIMEOUT"])
+
+    if app.config["REMINDER_SCHEDULER"]:
+        def notify(upcoming):
+            with app.app_context():
+                process_schedule_data({"upcoming": upcoming})
+
+        scheduler = ReminderScheduler(
+            get_manager(app),
+            notify,
+            lead=timedelta(minutes=app.config["REMINDER_LEAD_MINUTES"]),
+            start_delay=timedelta(seconds=app.config["REMINDER_START_DELAY"]),
+        )
+        scheduler.start()
+        app.extensions["reminder_scheduler"] = scheduler
+        atexit.register(scheduler.stop)
 
     return app
@@ -0,0 +1,104 @@
+"""
+asyncio serving mode: the Flask blueprint's routes on aiohttp.
+
+    SERVER=aiohttp python run.py
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from app.utils import metrics, tracing
+from app.utils.graph_client import AsyncGraphAPIClient
+from app.utils.whatsapp_utils import async_checking
+from app.views import handle_webhook_event, verify_subscription
+
+
+def create_aio_app(flask_app) -> web.Application:
+    """
+    Serve ``flask_app`` (from ``create_app``) with aiohttp.
+
+    Connections, signature checks, JSON parsing and outbound sends (through
+    ``AsyncGraphAPIClient``) live on the event loop, so thousands of deliveries and
+    sends can be in flight without a thread each. Work that blocks on the database
+    (inline command handling, DEDUP_PERSISTENT claims, /check) runs inside the
+    Flask app context on ``AIO_THREADS`` threads, sized like the DB pool, so the
+    command handlers and ScheduleManager are the same code as in the waitress mode.
+    """
+    config = flask_app.config
+    executor = ThreadPoolExecutor(max_workers=config["AIO_THREADS"], thread_name_prefix="aio-blocking")
+    graph = AsyncGraphAPIClient.from_config(config)
+    outbound = flask_app.extensions["outbound"]
+    verifier = flask_app.extensions["signature_verifier"]
+    # the webhook handler only blocks when it processes inline or claims ids in the database
+    blocking_webhook = not config["WEBHOOK_ASYNC"] or config["DEDUP_PERSISTENT"]
+
+    def with_context(func, *args):
+        with flask_app.app_context():
+            return func(*args)
+
+    async def in_thread(func, *args):
+        # the executor thread runs in a copy of this task's context so its spans join the request's trace
+        call = functools.partial(contextvars.copy_context().run, with_context, func, *args)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    async def webhook_get(request):
+        response, status = with_context(verify_subscription, request.query)
+        if isinstance(response, str):
+            return web.Response(text=response, status=status)
+        return web.json_response(response, status=status)
+
+    async def webhook_post(request):
+        # a decorator would close the trace when the coroutine is created, so open it in the body
+        with tracing.trace("webhook"):
+            body = await request.read()
+            if not verifier.check(body, request.headers.get("X-Hub-Signature-256", "")):
+                return web.json_response({"status": "error", "message": "Invalid signature"}, status=403)
+            try:
+                event = json.loads(body)
+            except ValueError:  # JSONDecodeError, or bytes that are not UTF-8
+                logging.error("Failed to decode JSON")
+                return web.json_response({"status": "error", "message": "Invalid JSON provided"}, status=400)
+
+            if blocking_webhook:
+                payload, status = await in_thread(handle_webhook_event, event)
+            else:
+                payload, status = with_context(handle_webhook_event, event)
+            return web.json_response(payload, status=status)
+
+    async def check(request):
+        def run():
+            response, status = async_checking()
+            return response.get_data(), status
+
+        body, status = await in_thread(run)
+        return web.Response(body=body, status=status, content_type="application/json")
+
+    async def metrics_endpoint(request):
+        return web.Response(body=metrics.REGISTRY.render().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    async def on_startup(aio_app):
+        await graph.start()
+        outbound.attach_loop(asyncio.get_running_loop(), graph)
+
+    async def on_shutdown(aio_app):
+        # sends queued from now on go through the sender threads; the loop is about to close
+        await outbound.detach_loop()
+
+    async def on_cleanup(aio_app):
+        await graph.close_async()
+        executor.shutdown(wait=True)
+
+    aio_app = web.Application()
+    aio_app.router.add_get("/webhook", webhook_get)
+    aio_app.router.add_post("/webhook", webhook_post)
+    aio_app.router.add_get("/check", check)  # HEAD is routed here too
+    aio_app.router.add_get("/metrics", metrics_endpoint)
+    aio_app.on_startup.append(on_startup)
+    aio_app.on_shutdown.append(on_shutdown)
+    aio_app.on_cleanup.append(on_cleanup)
+    return aio_app
@@ -9,11 +9,59 @@ def load_configurations(app):
     app.config["YOUR_PHONE_NUMBER"] = os.getenv("YOUR_PHONE_NUMBER")
     app.config["APP_ID"] = os.getenv("APP_ID")
     app.config["APP_SECRET"] = os.getenv("APP_SECRET")
+    # while rotating the app secret, list the old one(s) here (comma-separated) so both are accepted
+    app.config["APP_SECRETS"] = [app.config["APP_SECRET"]] + [s.strip() for s in os.getenv("APP_SECRET_PREVIOUS", "").split(",") if s.strip()]
     app.config["RECIPIENT_WAID"] = os.getenv("RECIPIENT_WAID")
     app.config["VERSION"] = os.getenv("VERSION")
     app.config["PHONE_NUMBER_ID"] = os.getenv("PHONE_NUMBER_ID")
     app.config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
 
+    # outbound Graph API client
+    app.config["GRAPH_POOL_SIZE"] = int(os.getenv("GRAPH_POOL_SIZE", "10"))
+    app.config["GRAPH_TIMEOUT"] = float(os.getenv("GRAPH_TIMEOUT", "10"))
+    app.config["GRAPH_MAX_RETRIES"] = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+    app.config["GRAPH_BASE_URL"] = os.getenv("GRAPH_BASE_URL", "https://graph.facebook.com")
+
+    # outbound pacing and retries; rates of 0 disable a limit. OUTBOUND_ASYNC follows WEBHOOK_ASYNC
+    # unless set, since serverless hosts cannot keep the sender threads alive either
+    app.config["OUTBOUND_ASYNC"] = os.getenv("OUTBOUND_ASYNC", os.getenv("WEBHOOK_ASYNC", "true")).lower() in ("1", "true", "yes")
+    app.config["OUTBOUND_RATE"] = float(os.getenv("OUTBOUND_RATE", "80"))
+    app.config["OUTBOUND_BURST"] = float(os.getenv("OUTBOUND_BURST", "80"))
+    app.config["OUTBOUND_RECIPIENT_PER_MINUTE"] = float(os.getenv("OUTBOUND_RECIPIENT_PER_MINUTE", "10"))
+    app.config["OUTBOUND_RECIPIENT_BURST"] = float(os.getenv("OUTBOUND_RECIPIENT_BURST", "45"))
+    app.config["OUTBOUND_COALESCE_MS"] = float(os.getenv("OUTBOUND_COALESCE_MS", "250"))
+    app.config["OUTBOUND_WORKERS"] = int(os.getenv("OUTBOUND_WORKERS", "4"))
+    app.config["OUTBOUND_MAX_AGE_HOURS"] = float(os.getenv("OUTBOUND_MAX_AGE_HOURS", "24"))
+
+    # webhook redelivery dedup; DEDUP_PERSISTENT also records message ids in Postgres
+    app.config["DEDUP_MAX_SIZE"] = int(os.getenv("DEDUP_MAX_SIZE", "10000"))
+    app.config["DEDUP_TTL"] = float(os.getenv("DEDUP_TTL", "86400"))
+    app.config["DEDUP_PERSISTENT"] = os.getenv("DEDUP_PERSISTENT", "false").lower() in ("1", "true", "yes")
+
+    # in-process reminders; disable where no long-lived process exists and poll GET /check instead
+    app.config["REMINDER_SCHEDULER"] = os.getenv("REMINDER_SCHEDULER", "true").lower() in ("1", "true", "yes")
+    app.config["REMINDER_LEAD_MINUTES"] = int(os.getenv("REMINDER_LEAD_MINUTES", "35"))
+    # seconds before the scheduler's first database read, keeping it off the cold-start path
+    app.config["REMINDER_START_DELAY"] = float(os.getenv("REMINDER_START_DELAY", "10"))
+
+    # background webhook processing; disable on serverless hosts where threads die with the request
+    app.config["WEBHOOK_ASYNC"] = os.getenv("WEBHOOK_ASYNC", "true").lower() in ("1", "true", "yes")
+    app.config["WEBHOOK_WORKERS"] = int(os.getenv("WEBHOOK_WORKERS", "4"))
+    if app.config["WEBHOOK_WORKERS"] < 1:
+        # no workers to hand deliveries to: process them inside the request
+        app.config["WEBHOOK_ASYNC"] = False
+    app.config["WEBHOOK_QUEUE_SIZE"] = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    app.config["WEBHOOK_DRAIN_TIMEOUT"] = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+    # SERVER="aiohttp" serves on asyncio (app/aio.py); AIO_THREADS run its database work, so match the pool size
+    app.config["SERVER"] = os.getenv("SERVER", "waitress").lower()
+    app.config["AIO_THREADS"] = int(os.getenv("AIO_THREADS", os.getenv("DB_POOL_MAX", "5")))
+
+    # JSON-lines traces (off unless TRACE_FILE is set); TRACE_PROFILE_MS > 0 also profiles requests slower than that
+    app.config["TRACE_FILE"] = os.getenv("TRACE_FILE") or None
+    app.config["TRACE_PROFILE_MS"] = float(os.getenv("TRACE_PROFILE_MS", "0"))
+    app.config["TRACE_PROFILE_INTERVAL_MS"] = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
+
 
 def configure_logging():
     logging.basicConfig(
@@ -1,14 +1,59 @@
-import pg8000
+import heapq
 import os
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
 from dotenv import load_dotenv
+from flask import current_app
 from datetime import datetime, timedelta
+from time import perf_counter
 from zoneinfo import ZoneInfo
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Iterator
+from app.utils.metrics import DB_QUERY_SECONDS, timed
+from app.utils.range_cache import RangeCache
+from app.utils.tracing import span, traced
+from app.utils.recurrence import WEEKDAYS, describe, next_occurrence, occurrences
+from app.utils.storage import Storage, create_storage
+
+
+def _instrumented(value: Optional[str] = None):
+    # DB_QUERY_SECONDS observation plus a "db.<method>" span when the call is part of a trace
+    def decorator(func):
+        name = value or func.__name__
+        return timed(DB_QUERY_SECONDS, value=name)(traced(f"db.{name}")(func))
+
+    return decorator
+
+
+class _BatchConnection:
+    # connection handed to methods running inside ScheduleManager.transaction();
+    # their commit() is deferred to the end of the batch
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        # only reached from _batch_item, which took the savepoint
+        self._conn.cursor().execute("ROLLBACK TO SAVEPOINT batch_item")
+
+
+class DuplicateScheduleError(ValueError):
+    """The owner already has an activity with this name at this time."""
+
 
 class ScheduleManager:
     
     def __init__(self):
-        self._init_db()
+        # STORAGE_BACKEND picks Postgres (default) or an embedded SQLite file; every query borrows a pooled connection
+        load_dotenv()
+        self._storage = create_storage()
+        # owner for calls that do not name one, and for rows created before schedules had owners
+        self._default_owner = os.getenv("RECIPIENT_WAID")
 
         self._month_names = {
             1: 'januari',
@@ -25,36 +70,138 @@ class ScheduleManager:
             12: 'desember'
         }
         self._month_indices = {v: k for k, v in self._month_names.items()}
-
-    
-    def _init_db(self) -> None:
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS schedules (
-                id SERIAL PRIMARY KEY,
-                time TEXT NOT NULL,
-                date TEXT NOT NULL,
-                month TEXT NOT NULL,
-                activity TEXT NOT NULL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def _get_connection(self) -> pg8000.Connection:
-        load_dotenv()
-        conn = pg8000.connect(
-            user     = os.getenv("DB_USER"),
-            password  = os.getenv("DB_PASS"),
-            host  = os.getenv("DB_HOST"),
-            port  = os.getenv("DB_PORT"),
-            database  = os.getenv("DB_NAME"),
+        self._local = threading.local()
+        self._listeners = []
+        self.range_cache = RangeCache(
+            max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("CACHE_TTL", "300")),
         )
-        return conn
+        # expired schedules are archived at most once per interval, this many rows per transaction
+        self._expiry_interval = float(os.getenv("EXPIRY_INTERVAL", "60"))
+        self._expiry_batch_size = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+
+    def migrate(self, batch_size: int = 500) -> None:
+        """
+        Create the schema, or bring an older one up to date, on the configured backend.
+
+        Not run on startup; deploys call it once with ``python -m app.migrate``.
+        """
+        self._storage.migrate(self._to_timestamp, self._default_owner, batch_size)
+
+    def _get_connection(self, may_fail: bool = False):
+        """
+        Borrowed connection, returned to the pool when the with-block exits.
+
+        Inside ``transaction()`` this is the batch's connection. Pass ``may_fail`` for
+        statements that can be rejected by the database (the unique-index UPDATEs) so a
+        failure rolls back only that command instead of aborting the whole batch.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return self._storage.connection()
+        if may_fail:
+            return self._batch_item(conn)
+        return nullcontext(_BatchConnection(conn))
+
+    @contextmanager
+    def _batch_item(self, conn):
+        conn.cursor().execute("SAVEPOINT batch_item")
+        batch_conn = _BatchConnection(conn)
+        try:
+            yield batch_conn
+        except BaseException:
+            batch_conn.rollback()
+            raise
+        # not released: that would be another round trip per command, and only the few
+        # may_fail commands of one delivery take a savepoint before the batch commits
+
+    @contextmanager
+    def transaction(self, write: bool = True):
+        """
+        Run every ScheduleManager call in the block on one connection and commit once.
+
+        ``write=False`` promises the block only reads, so backends that lock the whole
+        database for a writer (SQLite) let it run alongside one.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield
+            return
+
+        with self._storage.connection() as conn:
+            self._storage.begin(conn, write)
+            self._local.conn = conn
+            self._local.after_commit = []
+            self._local.dirty = False
+            try:
+                yield
+                conn.commit()
+                callbacks = self._local.after_commit
+            finally:
+                self._local.conn = None
+                self._local.after_commit = None
+                self._local.dirty = False
+
+        for callback, args in callbacks:
+            callback(*args)
+
+    def _after_commit(self, callback, *args) -> None:
+        # inside transaction() the change is not visible yet, so hold it until commit
+        pending = getattr(self._local, "after_commit", None)
+        if pending is not None:
+            pending.append((callback, args))
+        else:
+            callback(*args)
+
+    def _changed(self, owner: Optional[str], *timestamps: datetime) -> None:
+        # reads later in the same transaction must not be served from (or fill) the shared cache;
+        # without timestamps (a recurring rule changed) every cached window of the owner goes
+        if getattr(self._local, "after_commit", None) is not None:
+            self._local.dirty = True
+        self._after_commit(self._invalidate, owner, timestamps)
+
+    def _invalidate(self, owner: Optional[str], timestamps) -> None:
+        if not timestamps:
+            self.range_cache.invalidate_owner(owner)
+        for scheduled_at in timestamps:
+            self.range_cache.invalidate(owner, scheduled_at)
+
+    def add_listener(self, callback) -> None:
+        """Register ``callback(event, schedule_id, scheduled_at)``, called after each committed change."""
+        self._listeners.append(callback)
+
+    def _emit(self, event: str, schedule_id: int, scheduled_at: Optional[datetime]) -> None:
+        self._after_commit(self._dispatch, event, schedule_id, scheduled_at)
+
+    def _dispatch(self, event: str, schedule_id: int, scheduled_at: Optional[datetime]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(event, schedule_id, scheduled_at)
+            except Exception as e:
+                logging.error(f"Schedule listener failed: {e}")
+
+    @property
+    def storage(self) -> Storage:
+        return self._storage
+
+    @property
+    def pool(self):
+        return self._storage.pool
+
+    def close(self) -> None:
+        self._storage.close()
     
+    def _to_timestamp(self, year: int, date, month: str, time: str) -> datetime:
+        hour, minute = datetime.strptime(time, "%H:%M").timetuple()[3:5]
+        return datetime(year, self._month_indices[month.lower()], int(date), hour, minute, tzinfo=ZoneInfo("Asia/Jakarta"))
+
+    def _day_bounds(self, year: int, date, month: str) -> Tuple[datetime, datetime]:
+        start = datetime(year, self._month_indices[month.lower()], int(date), tzinfo=ZoneInfo("Asia/Jakarta"))
+        return start, start + timedelta(days=1)
+
+    def _render(self, scheduled_at: datetime) -> Tuple[str, int, str]:
+        local = scheduled_at.astimezone(ZoneInfo("Asia/Jakarta"))
+        return local.strftime("%H:%M"), local.day, self._month_names[local.month]
+
     def _validate_time_format(self, time_str: str) -> bool:
         try:
             datetime.strptime(time_str, "%H:%M")
@@ -72,140 +219,448 @@ class ScheduleManager:
             raise ValueError(f"Use month names e.g Januari")
         
     
-    def _find_schedule_by_activity(self, activity: str, date : str, month) -> Dict[str, Any]:
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, date, time, activity, month FROM schedules WHERE activity = %s AND date = %s AND month = %s", (activity, date, month))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row is None:
-            raise ValueError(f"No schedule found with activity: {activity}")
-        
-        return {
-        "id":     row[0],       
-        "date":     row[1],   
-        "time":     row[2],   
-        "activity": row[3],   
-        "month":    row[4],   
-    }
-    
-    def add_schedule(self, time: str, date: Optional[str], month: Optional[str], activity: str) -> str:
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def _first_on_day(self, activity: str, date, month: str, owner: str, year: Optional[int] = None) -> Tuple[str, Tuple]:
+        # subquery selecting the owner's earliest schedule with this name on that day,
+        # so lookup and change happen in the same statement
+        if year is None:
+            year = datetime.now(ZoneInfo("Asia/Jakarta")).year
+        day_start, day_end = self._day_bounds(year, date, month)
+        return (
+            "SELECT id FROM schedules WHERE owner_waid = %s AND activity = %s AND scheduled_at >= %s AND scheduled_at < %s ORDER BY scheduled_at LIMIT 1",
+            (owner, activity, day_start, day_end),
+        )
 
+    def _resolve_schedule(self, time: str, date, month: Optional[str], year: Optional[int]) -> Tuple[str, str, int, datetime]:
+        # fills in today's date/month/year where omitted and validates; returns (date, month, year, scheduled_at)
         now = datetime.now(ZoneInfo("Asia/Jakarta"))
         if month is None :
             month = self._month_names[now.month]
+        elif str(month).isdigit():
+            month = self._month_names.get(int(month), str(month))
         if date is None :
             date = now.day
-                
+        if year is None :
+            year = now.year
+
         self._validate_time_format(time)
         self._validate_date(date)
         self._validate_month(month)
-        cursor.execute("SELECT COUNT(*) FROM schedules WHERE date = %s AND activity = %s AND time = %s ", (date, activity, time))
-        if cursor.fetchone()[0] > 0:
-            conn.close()
-            raise ValueError(f"An activity with the name '{activity}' already exists")
-        
-        cursor.execute(
-            "INSERT INTO schedules (time, date, month, activity) VALUES (%s, %s, %s, %s)",
-            (time, date, month, activity)
-        )
-                
-        # new_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        try:
+            scheduled_at = self._to_timestamp(year, date, month, time)
+        except ValueError:
+            raise ValueError(f"{date} {month} is not a valid date")
+        return date, month, year, scheduled_at
+
+    def build_schedule(self, time: str, date: Optional[str], month: Optional[str], activity: str, year: Optional[int] = None) -> Tuple[str, datetime]:
+        """Validate one schedule the way ``add_schedule`` does and return ``(activity, scheduled_at)`` for ``add_schedules``."""
+        return activity, self._resolve_schedule(time, date, month, year)[3]
+
+    @_instrumented()
+    def add_schedule(self, time: str, date: Optional[str], month: Optional[str], activity: str, year: Optional[int] = None, owner: Optional[str] = None) -> str:
+        owner = owner or self._default_owner
+        date, month, year, scheduled_at = self._resolve_schedule(time, date, month, year)
+
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # the unique (owner_waid, activity, scheduled_at) index decides, so concurrent adds cannot both win
+            cursor.execute(
+                """
+                INSERT INTO schedules (time, date, month, year, scheduled_at, activity, owner_waid) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (owner_waid, activity, scheduled_at) DO NOTHING RETURNING id
+                """,
+                (time, date, month, year, scheduled_at, activity, owner)
+            )
+            row = cursor.fetchone()
+            conn.commit()
+
+        if row is None:
+            raise DuplicateScheduleError(f"An activity with the name '{activity}' already exists")
+        new_id = row[0]
+
+        self._changed(owner, scheduled_at)
+        self._emit("added", new_id, scheduled_at)
                 
         return f"Jadwal '{activity}' berhasil ditambahkan pada {date} {month}, pukul {time}" 
-    
 
-    def get_today_schedules(self) -> Tuple[str, List[Tuple[str, str]]]:
+    @_instrumented()
+    def add_schedules(self, entries: List[Tuple[str, datetime]], owner: Optional[str] = None, chunk_size: int = 500) -> Tuple[List[Tuple[str, datetime]], List[Tuple[str, datetime]]]:
+        """
+        Insert many ``(activity, scheduled_at)`` pairs in one transaction.
+
+        Repeats within ``entries`` are dropped up front and everything else goes in as
+        a single multi-row INSERT (per ``chunk_size`` rows) whose ON CONFLICT skips
+        pairs the owner already has. Returns ``(added, duplicates)``.
+        """
+        owner = owner or self._default_owner
+        seen, fresh, duplicates = set(), [], []
+        for entry in entries:
+            if entry in seen:
+                duplicates.append(entry)
+            else:
+                seen.add(entry)
+                fresh.append(entry)
+
+        inserted = {}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for offset in range(0, len(fresh), chunk_size):
+                rows = []
+                for activity, scheduled_at in fresh[offset:offset + chunk_size]:
+                    time, date, month = self._render(scheduled_at)
+                    rows.append((time, date, month, scheduled_at.astimezone(ZoneInfo("Asia/Jakarta")).year, scheduled_at, activity, owner))
+                cursor.execute(
+                    "INSERT INTO schedules (time, date, month, year, scheduled_at, activity, owner_waid) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+                    + " ON CONFLICT (owner_waid, activity, scheduled_at) DO NOTHING RETURNING id, activity, scheduled_at",
+                    [value for row in rows for value in row]
+                )
+                for schedule_id, activity, scheduled_at in cursor.fetchall():
+                    inserted[(activity, scheduled_at)] = schedule_id
+            conn.commit()
+
+        added = [entry for entry in fresh if entry in inserted]
+        duplicates.extend(entry for entry in fresh if entry not in inserted)
+        if added:
+            self._changed(owner, *[scheduled_at for _, scheduled_at in added])
+            for entry in added:
+                self._emit("added", inserted[entry], entry[1])
+        return added, duplicates
+
+    @_instrumented()
+    def add_recurring(self, time: str, every: str, activity: str, until_date: Optional[str] = None, until_month: Optional[str] = None, until_year: Optional[int] = None, owner: Optional[str] = None) -> str:
+        """
+        Store a schedule that repeats ``every`` ``hari`` (daily), a weekday name
+        (weekly) or ``tanggal N`` (monthly on day N), optionally until the end of
+        ``until_date`` ``until_month``. It is one row however often it repeats;
+        occurrences are expanded when a window is read. Starts at the first
+        occurrence from now on.
+        """
+        owner = owner or self._default_owner
+        self._validate_time_format(time)
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
+        hour, minute = datetime.strptime(time, "%H:%M").timetuple()[3:5]
+        base = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+        every = every.lower()
+        if every == "hari":
+            frequency = "daily"
+        elif every in WEEKDAYS:
+            frequency = "weekly"
+            base += timedelta(days=(WEEKDAYS[every] - base.weekday()) % 7)
+        else:
+            frequency = "monthly"
+            day = every.split()[-1]
+            self._validate_date(day)
+            # anchor on this month, or the next one that has the day
+            for offset in range(12):
+                month_index = now.month - 1 + offset
+                try:
+                    base = base.replace(year=now.year + month_index // 12, month=month_index % 12 + 1, day=int(day))
+                    break
+                except ValueError:
+                    continue
+        starts_at = next_occurrence(base, frequency, now, inclusive=True)
+
+        until_at = None
+        if until_date is not None:
+            until_month = until_month or self._month_names[now.month]
+            self._validate_date(until_date)
+            self._validate_month(until_month)
+            year = until_year or now.year
+            try:
+                until_at = self._day_bounds(year, until_date, until_month)[1] - timedelta(microseconds=1)
+                if until_year is None and until_at < starts_at:
+                    until_at = self._day_bounds(year + 1, until_date, until_month)[1] - timedelta(microseconds=1)
+            except ValueError:
+                raise ValueError(f"{until_date} {until_month} is not a valid date")
+            if until_at < starts_at:
+                raise ValueError(f"{until_date} {until_month} is before the first occurrence")
+
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO recurring_schedules (owner_waid, activity, frequency, starts_at, until_at) VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (owner_waid, activity) DO NOTHING RETURNING id
+                """,
+                (owner, activity, frequency, starts_at, until_at)
+            )
+            row = cursor.fetchone()
+            conn.commit()
+
+        if row is None:
+            raise DuplicateScheduleError(f"A recurring activity with the name '{activity}' already exists")
+        self._changed(owner)
+        self._emit("added", -row[0], starts_at)
+
+        _, date, month = self._render(starts_at)
+        response = f"Jadwal '{activity}' berhasil ditambahkan {describe(frequency, starts_at)} pukul {time}, mulai {date} {month}"
+        if until_at is not None:
+            _, date, month = self._render(until_at)
+            response += f" sampai {date} {month} {until_at.year}"
+        return response
+
+    @_instrumented()
+    def remove_recurring(self, activity: str, owner: Optional[str] = None) -> bool:
+        owner = owner or self._default_owner
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM recurring_schedules WHERE owner_waid = %s AND activity = %s RETURNING id",
+                (owner, activity)
+            )
+            row = cursor.fetchone()
+            conn.commit()
 
-        today = datetime.now(ZoneInfo("Asia/Jakarta"))
-        current_date = today.day
-        month_name = self._month_names[today.month]
-            
-        conn = self._get_connection()
-        cursor = conn.cursor()
-            
+        if row is None:
+            return False
+        self._changed(owner)
+        self._emit("removed", -row[0], None)
+        return True
+
+    @_instrumented()
+    def get_recurring(self, owner: Optional[str] = None) -> List[Tuple[str, str, datetime, Optional[datetime]]]:
+        """The owner's recurring schedules that have not ended, as ``(activity, frequency, starts_at, until_at)``."""
+        owner = owner or self._default_owner
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT activity, frequency, starts_at, until_at FROM recurring_schedules
+                WHERE owner_waid = %s AND (until_at IS NULL OR until_at >= %s) ORDER BY activity
+                """,
+                (owner, datetime.now(ZoneInfo("Asia/Jakarta")))
+            )
+            return list(cursor.fetchall())
+
+    def get_range(self, start: datetime, end: datetime, owner: Optional[str] = None) -> List[Tuple[str, str, int, str]]:
+        # one (owner_waid, scheduled_at) index range scan for any window, already ordered by the database,
+        # merged with the owner's recurring schedules expanded over the same window
+        owner = owner or self._default_owner
+        if getattr(self._local, "dirty", False):
+            return self._load_range(start, end, owner)
+        return self.range_cache.get_or_load("range", owner, start, end, lambda: self._load_range(start, end, owner))
+
+    @_instrumented("get_range")
+    def _load_range(self, start: datetime, end: datetime, owner: str) -> List[Tuple[str, str, int, str]]:
+        return list(self.iter_range(start, end, owner))
+
+    def iter_range(self, start: datetime, end: datetime, owner: Optional[str] = None, batch_size: int = 200) -> Iterator[Tuple[str, str, int, str]]:
+        """
+        The same rows as ``get_range``, fetched ``batch_size`` at a time and not cached.
+
+        Holds a pooled connection until the iterator is exhausted or closed. Only the
+        time spent in the database is observed, once the iterator ends, and each
+        round trip gets its own ``db.iter_range`` span so none is left open across a
+        ``yield``.
+        """
+        owner = owner or self._default_owner
+        elapsed = 0.0
+        try:
+            started = perf_counter()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                with span("db.iter_range", step="query"):
+                    recurring = self._expand_recurring(cursor, owner, start, end)
+                    cursor.execute(
+                        "SELECT scheduled_at, activity FROM schedules WHERE owner_waid = %s AND scheduled_at >= %s AND scheduled_at < %s ORDER BY scheduled_at, id",
+                        (owner, start, end)
+                    )
+                elapsed += perf_counter() - started
+
+                def batches():
+                    nonlocal elapsed
+                    while True:
+                        started = perf_counter()
+                        with span("db.iter_range", step="fetch") as fetch:
+                            rows = cursor.fetchmany(batch_size)
+                            if fetch is not None:
+                                fetch.attrs["rows"] = len(rows)
+                        elapsed += perf_counter() - started
+                        if not rows:
+                            return
+                        yield from rows
+
+                for scheduled_at, activity in heapq.merge(batches(), recurring, key=lambda row: row[0]):
+                    time, date, month = self._render(scheduled_at)
+                    yield time, activity, date, month
+        finally:
+            DB_QUERY_SECONDS.observe(elapsed, method="iter_range")
+
+    def _expand_recurring(self, cursor, owner: str, start: datetime, end: datetime) -> List[Tuple[datetime, str]]:
+        # one row per rule, however many times it repeats; occurrences are computed for the window only
         cursor.execute(
-            "SELECT time, activity FROM schedules WHERE date = %s AND month = %s ORDER BY time",
-            (current_date, month_name)
+            """
+            SELECT starts_at, frequency, until_at, activity FROM recurring_schedules
+            WHERE owner_waid = %s AND starts_at < %s AND (until_at IS NULL OR until_at >= %s)
+            """,
+            (owner, end, start)
         )
-        schedules = cursor.fetchall()
-            
-        conn.close()
-            
-        day_info = f"{current_date} {month_name}"
-        return day_info, schedules
+        expanded = [
+            (scheduled_at, activity)
+            for starts_at, frequency, until_at, activity in cursor.fetchall()
+            for scheduled_at in occurrences(starts_at, frequency, until_at, start, end)
+        ]
+        expanded.sort(key=lambda row: row[0])
+        return expanded
 
-    def get_weekly_schedules(self) -> List[Tuple[str, str, str, str]]:
+    def cached_view(self, kind: str, owner: Optional[str], start: datetime, end: datetime, build):
+        """Cache a value derived from one owner's window (e.g. a formatted reply) with the same invalidation as get_range."""
+        owner = owner or self._default_owner
+        if getattr(self._local, "dirty", False):
+            return build()
+        return self.range_cache.get_or_load(kind, owner, start, end, build)
 
+    def day_label(self, day: datetime) -> str:
+        return f"{day.day} {self._month_names[day.month]}"
+
+    def today_range(self) -> Tuple[datetime, datetime]:
         today = datetime.now(ZoneInfo("Asia/Jakarta"))
-        start_of_week = today - timedelta(days=today.weekday())
-        
-        week_dates = []
-        for i in range(7):  # 7 hari dalam seminggu
-            day = start_of_week + timedelta(days=i)
-            week_dates.append((day.day, self._month_names[day.month]))
-        
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        all_schedules = []
-        
-        for date, month in week_dates:
-            cursor.execute(""" SELECT time, activity, date, month FROM schedules WHERE date = %s AND month = %s ORDER BY time """, (date, month))
-            
-            day_schedules = cursor.fetchall()
-            all_schedules.extend(day_schedules)
-        
-        conn.close()
-        
-        all_schedules.sort(key=lambda x: (self._month_indices[x[3]], x[2], x[0]))
-        
-        return all_schedules
+        return self._day_bounds(today.year, today.day, self._month_names[today.month])
+
+    def week_range(self) -> Tuple[datetime, datetime]:
+        start, _ = self.today_range()
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(days=7)  # 7 hari dalam seminggu
+
+    def month_range(self) -> Tuple[datetime, datetime]:
+        start, _ = self.today_range()
+        start = start.replace(day=1)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return start, end
+
+    def get_today_schedules(self, owner: Optional[str] = None) -> Tuple[str, List[Tuple[str, str]]]:
+        start, end = self.today_range()
+        schedules = [(time, activity) for time, activity, _, _ in self.get_range(start, end, owner)]
+
+        return self.day_label(start), schedules
+
+    def get_weekly_schedules(self, owner: Optional[str] = None) -> List[Tuple[str, str, int, str]]:
+        return self.get_range(*self.week_range(), owner)
+
+    def get_monthly_schedules(self, owner: Optional[str] = None) -> List[Tuple[str, str, int, str]]:
+        return self.get_range(*self.month_range(), owner)
     
-    # check every 30 min
-    def check_schedules(self) -> Dict[str, List[Dict[str, str]]]:
+    # manual trigger (GET /check); the reminder scheduler normally fires these on time
+    @_instrumented()
+    def check_schedules(self, lead: timedelta = timedelta(minutes=35)) -> Dict[str, List[Dict[str, str]]]:
 
         now = datetime.now(ZoneInfo("Asia/Jakarta"))
-        current_day = now.day
-        current_month = now.month
-        current_time = now.strftime("%H:%M")
 
         #range notification
-        future_time_dt = now + timedelta(minutes=35)
-        future_time = future_time_dt.strftime("%H:%M")
-
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        future_time = now + lead
 
         self.clean_outdated_activities()
 
-        cursor.execute(
-            """
-            SELECT activity, time FROM schedules WHERE date = %s AND month = %s AND time::time > %s::time AND time::time <= %s::time
-            """,
-            (str(current_day), self._month_names[current_month], current_time, future_time)
-        )
-        upcoming = [
-            {"activity": act, "time": t}
-            for act, t in cursor.fetchall()
-        ]
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE schedules SET notified_at = %s
+                WHERE scheduled_at > %s AND scheduled_at <= %s AND notified_at IS NULL
+                RETURNING activity, scheduled_at, owner_waid
+                """,
+                (now, now, future_time)
+            )
+            rows = list(cursor.fetchall())
+            conn.commit()
 
-        conn.close()
+        rows = sorted(rows + self._claim_recurring(now, future_time), key=lambda row: row[1])
         return {
-            "upcoming": upcoming
+            "upcoming": self._reminder_items(rows)
         }
+
+    @_instrumented()
+    def get_pending_reminders(self, start: datetime, end: datetime) -> List[Tuple[int, datetime]]:
+        # recurring rules are listed under their negated id, with their next unsent occurrence
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, scheduled_at FROM schedules WHERE notified_at IS NULL AND scheduled_at > %s AND scheduled_at <= %s",
+                (start, end)
+            )
+            pending = list(cursor.fetchall())
+            pending.extend((-rule_id, occurrence) for rule_id, occurrence in self._due_recurring(cursor, start, end))
+        return pending
+
+    def _due_recurring(self, cursor, start: datetime, end: datetime, rule_ids: Optional[List[int]] = None) -> List[Tuple[int, datetime]]:
+        # (rule id, occurrence) for each rule whose next unsent occurrence after ``start`` is at or before ``end``
+        sql = """
+            SELECT id, starts_at, frequency, until_at, notified_through FROM recurring_schedules
+            WHERE starts_at <= %s AND (until_at IS NULL OR until_at > %s)
+        """
+        params = [end, start]
+        if rule_ids is not None:
+            sql += f" AND id IN ({', '.join(['%s'] * len(rule_ids))})"
+            params.extend(rule_ids)
+        cursor.execute(sql, params)
+
+        due = []
+        for rule_id, starts_at, frequency, until_at, notified_through in cursor.fetchall():
+            after = max(start, notified_through) if notified_through is not None else start
+            occurrence = next_occurrence(starts_at, frequency, after, until_at)
+            if occurrence is not None and occurrence <= end:
+                due.append((rule_id, occurrence))
+        return due
+
+    def _claim_recurring(self, now: datetime, until: datetime, rule_ids: Optional[List[int]] = None) -> List[Tuple[str, datetime, str]]:
+        # notified_through moves forward in the same statement that claims, so each occurrence is sent once
+        claimed = []
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            for rule_id, occurrence in self._due_recurring(cursor, now, until, rule_ids):
+                cursor.execute(
+                    """
+                    UPDATE recurring_schedules SET notified_through = %s
+                    WHERE id = %s AND (notified_through IS NULL OR notified_through < %s)
+                    RETURNING activity, owner_waid
+                    """,
+                    (occurrence, rule_id, occurrence)
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    claimed.append((row[0], occurrence, row[1]))
+            conn.commit()
+        return claimed
+
+    @_instrumented()
+    def claim_reminders(self, ids: List[int], until: datetime) -> List[Dict[str, str]]:
+        # marks and returns only rows nobody has notified yet, so each reminder is sent once;
+        # negative ids are recurring rules (see get_pending_reminders)
+        schedule_ids = [i for i in ids if i > 0]
+        rule_ids = [-i for i in ids if i < 0]
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
+        rows = []
+        if schedule_ids:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    UPDATE schedules SET notified_at = %s
+                    WHERE id IN ({", ".join(["%s"] * len(schedule_ids))}) AND notified_at IS NULL AND scheduled_at > %s AND scheduled_at <= %s
+                    RETURNING activity, scheduled_at, owner_waid
+                    """,
+                    (now, *schedule_ids, now, until)
+                )
+                rows = list(cursor.fetchall())
+                conn.commit()
+        if rule_ids:
+            rows += self._claim_recurring(now, until, rule_ids)
+
+        return self._reminder_items(sorted(rows, key=lambda row: row[1]))
+
+    def _reminder_items(self, rows) -> List[Dict[str, str]]:
+        return [
+            {"activity": act, "time": self._render(scheduled_at)[0], "owner": owner or self._default_owner}
+            for act, scheduled_at, owner in rows
+        ]
     
-    def update_activity_name(self, activity: str, date: Optional[str], month : Optional[str] ,new_activity: str) -> bool: 
+    @_instrumented()
+    def update_activity_name(self, activity: str, date: Optional[str], month : Optional[str] ,new_activity: str, owner: Optional[str] = None) -> bool: 
 
+        owner = owner or self._default_owner
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
         if month is None :
-            now = datetime.now(ZoneInfo("Asia/Jakarta"))
-
             month = self._month_names[now.month]
         if date is None :
             date = now.day
@@ -213,26 +668,27 @@ class ScheduleManager:
         self._validate_date(date)
         self._validate_month(month)
 
+        match_sql, match_params = self._first_on_day(activity, date, month, owner)
         try:
-            schedule = self._find_schedule_by_activity(activity, date, month)
-        except ValueError:
-            return False
+            with self._get_connection(may_fail=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"UPDATE schedules SET activity = %s WHERE id = ({match_sql}) RETURNING scheduled_at",
+                    (new_activity, *match_params)
+                )
+                row = cursor.fetchone()
+                conn.commit()
+        except self._storage.IntegrityError:
+            raise DuplicateScheduleError(f"An activity with the name '{new_activity}' already exists at that time")
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "UPDATE schedules SET activity = %s WHERE id = %s",
-            (new_activity, schedule["id"])
-        )
-
-        success = (cursor.rowcount == 1)
-        conn.commit()
-        conn.close()
-
-        return success
+        if row is None:
+            return False
+        self._changed(owner, row[0])
+        return True
     
-    def update_schedule_time(self, activity: str, date : str, new_date: str, month: Optional[str]) -> bool:
+    @_instrumented()
+    def update_schedule_time(self, activity: str, date : str, new_date: str, month: Optional[str], owner: Optional[str] = None) -> bool:
+        owner = owner or self._default_owner
         self._validate_date(date)
         self._validate_date(new_date)
 
@@ -240,28 +696,45 @@ class ScheduleManager:
             now = datetime.now(ZoneInfo("Asia/Jakarta"))
 
             month = self._month_names[now.month]  
-        
+        self._validate_month(month)
+
+        year = datetime.now(ZoneInfo("Asia/Jakarta")).year
+        old_day, _ = self._day_bounds(year, date, month)
         try:
-            schedule = self._find_schedule_by_activity(activity, date, month)
+            new_day, _ = self._day_bounds(year, new_date, month)
         except ValueError:
+            raise ValueError(f"{new_date} {month} is not a valid date")
+        days = (new_day - old_day).days
+
+        match_sql, match_params = self._first_on_day(activity, date, month, owner, year)
+        try:
+            with self._get_connection(may_fail=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    UPDATE schedules SET date = %s, scheduled_at = {self._storage.shift_days("scheduled_at")}, notified_at = NULL
+                    WHERE id = ({match_sql}) RETURNING id, scheduled_at
+                    """,
+                    (new_date, days, *match_params)
+                )
+                row = cursor.fetchone()
+                conn.commit()
+        except self._storage.IntegrityError:
+            raise DuplicateScheduleError(f"An activity with the name '{activity}' already exists on {new_date} {month}")
+
+        if row is None:
             return False
-    
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE schedules SET date = %s WHERE id = %s", (new_date, schedule["id"]))
-        
-        success = (cursor.rowcount == 1)
-        conn.commit()
-        conn.close()
+        schedule_id, new_scheduled_at = row
+        self._changed(owner, new_scheduled_at - timedelta(days=days), new_scheduled_at)
+        self._emit("updated", schedule_id, new_scheduled_at)
+        return True
         
-        return success
-        
-    def remove_activity(self, activity: str,  date : Optional[str] , month: Optional[str] ) -> bool:
+    @_instrumented()
+    def remove_activity(self, activity: str,  date : Optional[str] , month: Optional[str], owner: Optional[str] = None) -> bool:
 
+        owner = owner or self._default_owner
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
         if month is None:
-            now = datetime.now(ZoneInfo("Asia/Jakarta"))
-
             month = self._month_names[now.month] 
         if date is None :
             date = now.day
@@ -269,45 +742,219 @@ class ScheduleManager:
         self._validate_date(date)
         self._validate_month(month)
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        match_sql, match_params = self._first_on_day(activity, date, month, owner)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM schedules WHERE id = ({match_sql}) RETURNING id, scheduled_at", match_params)
+            row = cursor.fetchone()
+            conn.commit()
 
-        try:
-            schedule = self._find_schedule_by_activity(activity, date, month)
-        except ValueError:
+        if row is None:
             return False
-        
-        cursor.execute("DELETE FROM schedules WHERE activity = %s AND id = %s", (activity, schedule["id"]))
-        
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
-        
-        return success
+        self._changed(owner, row[1])
+        self._emit("removed", row[0], None)
+        return True
     
-    def clean_outdated_activities(self):
+    @_instrumented()
+    def clean_outdated_activities(self, force: bool = False) -> int:
+        """
+        Move schedules whose time has passed into ``schedules_archive`` and delete
+        recurring schedules that have ended.
+
+        Rows go over in batches of ``EXPIRY_BATCH_SIZE``, one short transaction each,
+        taken in ``scheduled_at`` (``until_at``) order from the index. Archived rows leave
+        the live table, so the range below ``now`` only holds rows that expired since the
+        last sweep. The watermark in ``expiry_state`` records how far the last sweep got;
+        a call within ``EXPIRY_INTERVAL`` seconds of it returns without touching
+        ``schedules`` unless ``force`` is set. Returns the number of rows archived or deleted.
+        """
         now = datetime.now(ZoneInfo("Asia/Jakarta"))
-        current_year = now.year
+        if not force and self._expiry_interval > 0:
+            watermark = self.expiry_watermark()
+            if watermark is not None and watermark > now - timedelta(seconds=self._expiry_interval):
+                return 0
+
+        total = 0
+        while True:
+            moved = self._archive_batch(now, self._expiry_batch_size)
+            total += len(moved)
+            done = len(moved) < self._expiry_batch_size
+            # one invalidation per (owner, day) rather than per archived row
+            affected = {}
+            for owner, scheduled_at in moved:
+                day = scheduled_at.astimezone(ZoneInfo("Asia/Jakarta")).date()
+                affected.setdefault((owner, day), scheduled_at)
+            for (owner, _), scheduled_at in affected.items():
+                self._changed(owner, scheduled_at)
+            if done:
+                break
+
+        while True:
+            owners = self._expire_recurring_batch(now, self._expiry_batch_size)
+            total += len(owners)
+            for owner in set(owners):
+                self._changed(owner)
+            if len(owners) < self._expiry_batch_size:
+                return total
+
+    def _expire_recurring_batch(self, before: datetime, limit: int) -> List[str]:
+        # their occurrences are all in the past; dropping the rule also frees its name for a new one
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                DELETE FROM recurring_schedules WHERE id IN (
+                    SELECT id FROM recurring_schedules WHERE until_at < %s ORDER BY until_at LIMIT %s
+                )
+                RETURNING owner_waid
+                """,
+                (before, limit)
+            )
+            rows = cursor.fetchall()
+            conn.commit()
+
+        return [row[0] for row in rows]
+
+    def _archive_batch(self, before: datetime, limit: int) -> List[Tuple[str, datetime]]:
+        # DELETE ... RETURNING and the archive INSERT share a transaction, so a row is never in both tables or neither
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                DELETE FROM schedules WHERE id IN (
+                    SELECT id FROM schedules WHERE scheduled_at < %s ORDER BY scheduled_at LIMIT %s
+                )
+                RETURNING id, time, date, month, activity, year, scheduled_at, notified_at, owner_waid
+                """,
+                (before, limit)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                cursor.execute(
+                    "INSERT INTO schedules_archive (id, time, date, month, activity, year, scheduled_at, notified_at, owner_waid, archived_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows)),
+                    [value for row in rows for value in (*row, before)]
+                )
+            # a full batch may leave rows behind, so the watermark only reaches ``before`` on the last one
+            watermark = before if len(rows) < limit else max(row[6] for row in rows)
+            cursor.execute(
+                """
+                INSERT INTO expiry_state (name, watermark) VALUES ('schedules', %s)
+                ON CONFLICT (name) DO UPDATE SET watermark = excluded.watermark
+                """,
+                (watermark,)
+            )
+            conn.commit()
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        return [(row[8], row[6]) for row in rows]
 
-        cursor.execute("SELECT id, date, month, time FROM schedules")
-        rows = cursor.fetchall()
-        for _id, date_str, month_str, time_str in rows: #check based on dateformat
-            try:
-                day = int(date_str)
-                month = self._month_indices.get(month_str.lower())
-                sched_dt = datetime.strptime(
-                    f"{current_year}-{month:02d}-{day:02d} {time_str}",  
-                    "%Y-%m-%d %H:%M")
-            except Exception:
-                continue
-
-            if sched_dt.replace(tzinfo=ZoneInfo("Asia/Jakarta")) < now:
-                cursor.execute("DELETE FROM schedules WHERE id = %s", (_id,))
-
-        conn.commit()
-        conn.close()
-        return 
-    
\ No newline at end of file
+    def expiry_watermark(self) -> Optional[datetime]:
+        """Up to when the last expiry sweep archived schedules, or None before the first sweep."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT watermark FROM expiry_state WHERE name = 'schedules'")
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    @_instrumented()
+    def claim_message(self, message_id: str, ttl: float) -> bool:
+        # True if this call claimed the id (new, or last seen longer than ttl seconds ago)
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO processed_messages (message_id, received_at) VALUES (%s, %s)
+                ON CONFLICT (message_id) DO UPDATE SET received_at = excluded.received_at
+                WHERE processed_messages.received_at < %s
+                RETURNING message_id
+                """,
+                (message_id, now, now - timedelta(seconds=ttl))
+            )
+            claimed = cursor.fetchone() is not None
+            conn.commit()
+
+        return claimed
+
+    @_instrumented()
+    def release_message(self, message_id: str) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM processed_messages WHERE message_id = %s", (message_id,))
+            conn.commit()
+
+    @_instrumented()
+    def purge_messages(self, ttl: float) -> int:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM processed_messages WHERE received_at < %s",
+                (datetime.now(ZoneInfo("Asia/Jakarta")) - timedelta(seconds=ttl),)
+            )
+            removed = cursor.rowcount
+            conn.commit()
+
+        return removed
+
+    @_instrumented()
+    def queue_outbound(self, recipient: str, body: str, error: str, retry_at: datetime) -> None:
+        """Persist a message the dispatcher could not deliver; it is retried after ``retry_at``."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO outbound_messages (recipient, body, last_error, created_at, next_attempt_at) VALUES (%s, %s, %s, %s, %s)",
+                (recipient, body, error, datetime.now(ZoneInfo("Asia/Jakarta")), retry_at)
+            )
+            conn.commit()
+
+    @_instrumented()
+    def pending_outbound(self, limit: int = 500) -> List[Tuple[int, str, str, int, datetime, datetime]]:
+        # oldest first: (id, recipient, body, attempts, created_at, next_attempt_at)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, recipient, body, attempts, created_at, next_attempt_at FROM outbound_messages ORDER BY id LIMIT %s",
+                (limit,)
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    @_instrumented()
+    def has_outbound(self, recipient: str) -> bool:
+        """Whether ``recipient`` has persisted messages waiting, which newer ones must queue behind."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM outbound_messages WHERE recipient = %s LIMIT 1", (recipient,))
+            return cursor.fetchone() is not None
+
+    @_instrumented()
+    def defer_outbound(self, message_id: int, error: str, retry_at: datetime) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE outbound_messages SET attempts = attempts + 1, last_error = %s, next_attempt_at = %s WHERE id = %s",
+                (error, retry_at, message_id)
+            )
+            conn.commit()
+
+    @_instrumented()
+    def delete_outbound(self, message_id: int) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM outbound_messages WHERE id = %s", (message_id,))
+            conn.commit()
+
+
+_manager_lock = threading.Lock()
+
+
+def get_manager(app=None) -> ScheduleManager:
+    """The app's ScheduleManager, created on first use. Creating it opens no connection."""
+    app = app or current_app._get_current_object()
+    manager = app.extensions.get("schedule_manager")
+    if manager is None:
+        with _manager_lock:
+            manager = app.extensions.get("schedule_manager")
+            if manager is None:
+                manager = app.extensions["schedule_manager"] = ScheduleManager()
+    return manager
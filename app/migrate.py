@@ -0,0 +1,25 @@
+"""
+Create or upgrade the database schema for the configured storage backend.
+
+Run once per deploy, before the new code serves traffic:
+
+    python -m app.migrate
+"""
+import logging
+
+from app.config import configure_logging
+from app.database import ScheduleManager
+
+
+def main() -> None:
+    configure_logging()
+    manager = ScheduleManager()
+    try:
+        manager.migrate()
+    finally:
+        manager.close()
+    logging.info(f"Schema is up to date ({manager.storage.name})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import re
+import string
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Union
+
+from app.utils.metrics import COMMAND_SECONDS
+from app.utils.tracing import span
+
+# chat habits like "hari ini?" or "bantuan!"; stripped from the end of a message before matching
+TRAILING_PUNCTUATION = "?!.,;:" + string.whitespace
+
+
+def _normalize(message_body: str) -> str:
+    return message_body.strip().lower().rstrip(TRAILING_PUNCTUATION)
+
+
+class Command(NamedTuple):
+    keyword: str
+    handler: Callable
+    pattern: Optional[Pattern]
+    usage: Optional[str]
+    read_only: bool = False
+
+
+class CommandRouter:
+    """
+    Maps chat commands to handlers.
+
+    Commands are indexed by their first word, so dispatch is one dict lookup plus a
+    prefix check over the few commands sharing that word. Argument patterns are
+    compiled once at registration; the handler receives the match object (or None
+    for commands without a pattern), the schedule manager and the sender's WA ID,
+    and returns the reply text or, for replies too long for one message, a list of texts.
+    Commands registered with ``read_only=True`` promise not to change any schedule.
+    """
+
+    def __init__(self, fallback_title: str = "Perintah tidak dikenali."):
+        self._index: Dict[str, List[Command]] = {}
+        self._commands: List[Command] = []
+        self.fallback_title = fallback_title
+
+    def command(self, *keywords: str, pattern: Optional[str] = None, usage: Optional[str] = None, read_only: bool = False):
+        compiled = re.compile(pattern, re.IGNORECASE) if pattern else None
+
+        def decorator(handler):
+            for keyword in keywords:
+                self.add(keyword, handler, compiled, usage, read_only)
+            return handler
+
+        return decorator
+
+    def add(self, keyword: str, handler: Callable, pattern: Optional[Pattern] = None, usage: Optional[str] = None,
+            read_only: bool = False) -> None:
+        keyword = keyword.lower()
+        command = Command(keyword, handler, pattern, usage, read_only)
+        candidates = self._index.setdefault(keyword.split()[0], [])
+        candidates.append(command)
+        # longest keyword first so "jadwal hari ini" wins over a shorter "jadwal ..."
+        candidates.sort(key=lambda c: len(c.keyword), reverse=True)
+        self._commands.append(command)
+
+    def resolve(self, message_body: str) -> Optional[Command]:
+        words = message_body.split(maxsplit=1)
+        if not words:
+            return None
+        for command in self._index.get(words[0], ()):
+            if message_body.startswith(command.keyword):
+                rest = message_body[len(command.keyword):]
+                if not rest or rest[0].isspace():
+                    return command
+        return None
+
+    def is_read_only(self, message_body: str) -> bool:
+        """Whether dispatching ``message_body`` leaves the schedules untouched (unknown commands only get help)."""
+        command = self.resolve(_normalize(message_body))
+        return command is None or command.read_only
+
+    def dispatch(self, message_body: str, manager, owner: Optional[str] = None) -> Union[str, List[str]]:
+        start = time.perf_counter()
+        message_body = _normalize(message_body)
+        with span("command.resolve"):
+            command = self.resolve(message_body)
+        if command is None:
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command="unknown")
+            return self.help(self.fallback_title)
+
+        name = command.handler.__name__
+        try:
+            match = None
+            if command.pattern is not None:
+                with span("command.match", command=name):
+                    match = command.pattern.match(message_body)
+                if match is None:
+                    name = f"{name}_usage"
+                    return command.usage or self.help(self.fallback_title)
+            with span("command.handle", command=name):
+                return command.handler(match, manager, owner)
+        finally:
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command=name)
+
+    def help(self, title: Optional[str] = None) -> str:
+        lines = [title] if title else []
+        lines.append("Perintah yang tersedia:")
+        seen = set()
+        for command in self._commands:
+            if command.handler in seen:
+                continue
+            seen.add(command.handler)
+            lines.append(f"- {command.keyword}")
+        return "\n".join(lines)
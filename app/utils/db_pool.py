@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Iterator, Tuple
+
+from app.utils.tracing import span
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections.
+
+    Connections are opened on demand, never up front, so creating the pool does
+    not touch the database.
+
+    Idle connections are kept in a LIFO stack so the warmest one is reused first.
+    Connections idle longer than ``health_check_after`` are pinged before being
+    handed out, and connections idle longer than ``idle_timeout`` are closed as
+    long as the pool stays above ``min_size``.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 5,
+        idle_timeout: float = 300.0,
+        health_check_after: float = 30.0,
+        acquire_timeout: float = 10.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception as e:
+            logging.warning(f"Discarding unhealthy DB connection: {e}")
+            return False
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now: float) -> list:
+        # caller holds the lock; oldest idle connections sit at the left end
+        evicted = []
+        while self._idle and self._size > self.min_size:
+            conn, released_at = self._idle[0]
+            if now - released_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            evicted.append(conn)
+        return evicted
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                now = time.monotonic()
+                evicted = self._evict_idle(now)
+
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    needs_check = now - released_at >= self.health_check_after
+                    reserved = False
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, needs_check, reserved = None, False, True
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(f"Timed out waiting for a DB connection (max_size={self.max_size})")
+                    self._cond.wait(remaining)
+                    conn = None
+                    reserved = False
+                    needs_check = False
+
+            for stale in evicted:
+                self._discard(stale)
+
+            if reserved:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if conn is None:
+                continue
+
+            if needs_check and not self._is_healthy(conn):
+                self._discard(conn)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                continue
+
+            return conn
+
+    def release(self, conn, broken: bool = False) -> None:
+        if not broken:
+            try:
+                conn.rollback()  # never hand out a connection mid-transaction
+            except Exception:
+                broken = True
+
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        with span("db.acquire"):
+            conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, broken=not self._is_alive(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class MessageDeduplicator:
+    """
+    Drops webhook redeliveries by WhatsApp message id.
+
+    The first tier is an in-process LRU with a TTL. The optional ``store`` tier
+    (``ScheduleManager`` implements ``claim_message`` / ``release_message``) keeps
+    the claim in Postgres so it holds across workers and restarts.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, max_size: int = 10000, ttl: float = 86400.0, store=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._store = store
+        self._claims = 0
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, message_id: str, now: float) -> bool:
+        # returns True if the id was already present and not expired
+        with self._lock:
+            seen_at = self._seen.get(message_id)
+            if seen_at is not None and now - seen_at < self.ttl:
+                self._seen.move_to_end(message_id)
+                return True
+
+            self._seen[message_id] = now
+            self._seen.move_to_end(message_id)
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return False
+
+    def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """Atomically check and claim ``message_id``; True means it was already handled."""
+        if not message_id:
+            return False
+
+        if self._remember(message_id, time.monotonic()):
+            return True
+
+        if self._store is not None:
+            if not self._store.claim_message(message_id, self.ttl):
+                return True
+            with self._lock:
+                self._claims += 1
+                purge = self._claims % self.PURGE_EVERY == 0
+            if purge:
+                self._store.purge_messages(self.ttl)
+
+        return False
+
+    def forget(self, message_id: Optional[str]) -> None:
+        """Release a claim so a later redelivery is processed, e.g. when the event was rejected."""
+        if not message_id:
+            return
+        with self._lock:
+            self._seen.pop(message_id, None)
+        if self._store is not None:
+            self._store.release_message(message_id)
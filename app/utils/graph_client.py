@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.metrics import GRAPH_RESPONSES, GRAPH_SEND_SECONDS
+from app.utils.tracing import span
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class GraphAPIError(Exception):
+    """Raised by AsyncGraphAPIClient; ``status`` is None when no response arrived."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class GraphAPIClient:
+    """
+    Keep-alive client for the WhatsApp Cloud API messages endpoint.
+
+    The endpoint URL and auth headers are built once, connections are pooled by a
+    single ``requests.Session`` and 429/5xx responses are retried with exponential
+    backoff and full jitter. Nothing here touches Flask, so it can be shared with
+    background threads.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        version: str,
+        phone_number_id: str,
+        pool_size: int = 10,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        base_url: str = "https://graph.facebook.com",
+    ):
+        self.api_root = f"{base_url.rstrip('/')}/{version}"
+        self.url = f"{self.api_root}/{phone_number_id}/messages"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-type": "application/json",
+            "Authorization": f"Bearer {access_token}",
+            "Connection": "keep-alive",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, config) -> "GraphAPIClient":
+        return cls(
+            access_token=config["ACCESS_TOKEN"],
+            version=config["VERSION"],
+            phone_number_id=config["PHONE_NUMBER_ID"],
+            pool_size=config.get("GRAPH_POOL_SIZE", 10),
+            timeout=config.get("GRAPH_TIMEOUT", 10.0),
+            max_retries=config.get("GRAPH_MAX_RETRIES", 3),
+            base_url=config.get("GRAPH_BASE_URL") or "https://graph.facebook.com",
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, data) -> requests.Response:
+        """
+        POST a JSON payload, retrying throttled and server errors.
+
+        Raises ``requests.RequestException`` (including ``HTTPError``) once retries are exhausted.
+        """
+        with GRAPH_SEND_SECONDS.time(), span("graph.post"):
+            return self._post_with_retries(data)
+
+    def _post_with_retries(self, data) -> requests.Response:
+        attempt = 0
+        while True:
+            try:
+                response = self._session.post(self.url, data=data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                GRAPH_RESPONSES.inc(status="error")
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+                logging.warning(f"Graph API request failed ({e}), retrying in {delay:.2f}s")
+            else:
+                GRAPH_RESPONSES.inc(status=str(response.status_code))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                logging.warning(f"Graph API returned {response.status_code}, retrying in {delay:.2f}s")
+
+            attempt += 1
+            time.sleep(delay)
+
+    def download_media(self, media_id: str, max_bytes: int = 1024 * 1024) -> bytes:
+        """Fetch an uploaded file: resolve the media id to its temporary URL, then download it."""
+        with span("graph.download_media"):
+            return self._download_media(media_id, max_bytes)
+
+    def _download_media(self, media_id: str, max_bytes: int) -> bytes:
+        response = self._session.get(f"{self.api_root}/{media_id}", timeout=self.timeout)
+        response.raise_for_status()
+        meta = response.json()
+        if int(meta.get("file_size") or 0) > max_bytes:
+            raise ValueError(f"File is larger than {max_bytes} bytes")
+
+        response = self._session.get(meta["url"], timeout=self.timeout)
+        response.raise_for_status()
+        if len(response.content) > max_bytes:
+            raise ValueError(f"File is larger than {max_bytes} bytes")
+        return response.content
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class AsyncGraphAPIClient(GraphAPIClient):
+    """
+    aiohttp counterpart of ``GraphAPIClient.post`` for the asyncio server (app/aio.py).
+
+    Same URL, headers, retry policy and metrics; each in-flight send is a coroutine
+    rather than a blocked thread. The inherited ``requests`` session still serves
+    the synchronous methods. Call ``start()`` from inside the event loop before
+    the first ``post_async`` and ``close_async()`` on shutdown.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._aio_session = None
+
+    async def start(self) -> None:
+        import aiohttp  # only needed by the asyncio server
+
+        self._aio_session = aiohttp.ClientSession(
+            headers=dict(self._session.headers),
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def close_async(self) -> None:
+        if self._aio_session is not None:
+            await self._aio_session.close()
+            self._aio_session = None
+
+    async def post_async(self, data) -> int:
+        """POST a JSON payload with the same retries as ``post``; raises ``GraphAPIError`` once they are exhausted."""
+        with GRAPH_SEND_SECONDS.time(), span("graph.post"):
+            return await self._post_with_retries_async(data)
+
+    async def _post_with_retries_async(self, data) -> int:
+        import aiohttp
+
+        attempt = 0
+        while True:
+            try:
+                async with self._aio_session.post(self.url, data=data) as response:
+                    await response.read()
+                    status, retry_after = response.status, response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                GRAPH_RESPONSES.inc(status="error")
+                if attempt >= self.max_retries:
+                    raise GraphAPIError(str(e) or type(e).__name__)
+                delay = self._backoff(attempt, None)
+                logging.warning(f"Graph API request failed ({e}), retrying in {delay:.2f}s")
+            else:
+                GRAPH_RESPONSES.inc(status=str(status))
+                if status < 400:
+                    return status
+                if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise GraphAPIError(f"HTTP {status}", status, retry_after)
+                delay = self._backoff(attempt, retry_after)
+                logging.warning(f"Graph API returned {status}, retrying in {delay:.2f}s")
+
+            attempt += 1
+            await asyncio.sleep(delay)
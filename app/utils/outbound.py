@@ -0,0 +1,557 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import requests
+
+from app.utils.graph_client import GraphAPIError
+from app.utils import tracing
+from app.utils.metrics import OUTBOUND_MESSAGES
+
+# WhatsApp rejects text bodies longer than this
+MAX_TEXT_LENGTH = 4096
+SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """
+    ``rate`` tokens per second, at most ``capacity`` banked. A rate of 0 or less
+    means unlimited. Not thread-safe; OutboundDispatcher locks around it.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available; 0 means one can be taken now."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self._tokens -= 1
+
+    def pause(self, seconds: float, now: float) -> None:
+        """Hold back the next token for ``seconds``, e.g. when the API answered 429 with Retry-After."""
+        if self.rate > 0:
+            self._refill(now)
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    def idle(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+class OutboundDispatcher:
+    """
+    Paces, batches and retries outbound WhatsApp texts.
+
+    ``send`` only queues. Texts for one recipient that arrive within
+    ``coalesce_window`` seconds go out as a single message (split only where the
+    WhatsApp body limit forces it). Each message takes a token from a global bucket
+    and from the recipient's own bucket and is posted by a small pool of sender
+    threads, one message per recipient at a time so replies keep their order.
+    The sender threads belong to the dispatcher rather than to an executor the
+    interpreter shuts down before ``atexit`` hooks run, so ``stop()`` can still
+    flush at exit.
+
+    A send that still fails after the Graph client's own retries is written to
+    ``store`` (ScheduleManager implements ``queue_outbound`` / ``pending_outbound``
+    / ``has_outbound`` / ``defer_outbound`` / ``delete_outbound``) and retried oldest first with
+    exponential backoff; while a recipient has persisted messages, newer ones are
+    queued behind them. Client errors other than 429 cannot succeed on retry and
+    are dropped, as are messages older than ``max_age``.
+
+    Until ``start()`` is called (serverless hosts), ``send`` delivers inline, behind
+    any persisted messages of the recipient, and those are retried by
+    ``retry_pending``, which ``GET /check`` calls.
+    """
+
+    def __init__(
+        self,
+        client,
+        build_payload: Callable[[str, str], str],
+        store=None,
+        rate: float = 80.0,
+        burst: float = 80.0,
+        recipient_rate: float = 10 / 60,
+        recipient_burst: float = 45.0,
+        coalesce_window: float = 0.25,
+        workers: int = 4,
+        retry_base: float = 30.0,
+        retry_max: float = 1800.0,
+        max_age: timedelta = timedelta(hours=24),
+    ):
+        self._client = client
+        self._build_payload = build_payload
+        self._store = store
+        self.coalesce_window = coalesce_window
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_age = max_age
+        self.workers = workers
+
+        self._global = TokenBucket(rate, burst)
+        self._recipient_rate = recipient_rate
+        self._recipient_burst = recipient_burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+        self._pending: Dict[str, List[str]] = {}
+        self._origins: Dict[str, str] = {}  # correlation id of the latest text queued per recipient, for tracing
+        self._ready: List[Tuple[float, int, str]] = []  # (due, seq, recipient); stale entries are skipped
+        self._seq = itertools.count()
+        self._in_flight = set()
+        self._backlog = set()  # recipients with persisted messages
+        self._requeued = set()  # recipients persisted while a retry pass was running
+        self._backlog_loaded = False
+        self._next_retry: Optional[float] = None
+        self._retrying = False
+        self._stopping = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._jobs: "queue.Queue[Optional[Tuple[Callable, tuple]]]" = queue.Queue()
+        self._senders: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_client = None
+        self._loop_jobs = 0  # sends handed to the loop and not finished yet
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop, client) -> None:
+        """
+        Post through ``client.post_async`` (AsyncGraphAPIClient) on ``loop`` instead of the
+        sender threads, so in-flight sends are not capped by ``workers``.
+        """
+        with self._cond:
+            self._loop, self._async_client = loop, client
+
+    async def detach_loop(self, timeout: float = 10.0) -> None:
+        """Go back to the sender threads and wait for the sends already on the loop; call before it closes."""
+        with self._cond:
+            self._loop = None
+        deadline = time.monotonic() + timeout
+        while self._loop_jobs and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    def start(self) -> None:
+        self._senders = [
+            threading.Thread(target=self._sender, name=f"outbound-sender-{i}", daemon=True)
+            for i in range(max(self.workers, 1))
+        ]
+        for sender in self._senders:
+            sender.start()
+        self._thread = threading.Thread(target=self._run, name="outbound-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Flush queued texts, waiting up to ``timeout``; whatever is left is persisted for retry.
+        Sends already posting are waited for, so every text ends up either sent or persisted.
+        """
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stopping = True
+            for recipient in self._pending:
+                heapq.heappush(self._ready, (0.0, next(self._seq), recipient))
+            self._cond.notify_all()
+            # a dispatcher that died cannot drain anything, so do not wait out the deadline for it
+            while (self._pending or self._in_flight) and self._thread.is_alive() and time.monotonic() < deadline:
+                self._cond.wait(max(min(deadline - time.monotonic(), 0.1), 0.01))
+            leftover, self._pending = self._pending, {}
+            self._origins = {}
+            self._closed = True
+            self._cond.notify_all()
+
+        self._thread.join(max(deadline - time.monotonic(), 0.1))
+        self._thread = None
+        # deliveries no sender has picked up yet are persisted, ahead of the newer texts still pending
+        unsent = []
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job[0] == self._deliver:
+                recipient, bodies, backlogged, _ = job[1]
+                unsent.append((recipient, bodies if backlogged else bodies[:1]))
+        for _ in self._senders:
+            self._jobs.put(None)
+        for sender in self._senders:
+            # a post already under way is bounded by the client's timeout; cutting it off at exit would lose it
+            sender.join()
+        for recipient, bodies in unsent:
+            for body in bodies:
+                self._persist(recipient, body, "not sent before shutdown")
+        for recipient, texts in leftover.items():
+            for body in self._coalesce(texts):
+                self._persist(recipient, body, "not sent before shutdown")
+
+    def send(self, recipient: str, text: str) -> None:
+        if self._thread is None:
+            self._send_now(recipient, text)
+            return
+        origin = tracing.current_correlation_id()
+        with self._cond:
+            texts = self._pending.setdefault(recipient, [])
+            if not texts:
+                heapq.heappush(self._ready, (time.monotonic() + self.coalesce_window, next(self._seq), recipient))
+            texts.append(text)
+            if origin:
+                self._origins[recipient] = origin
+            self._cond.notify()
+
+    def retry_pending(self) -> None:
+        """Retry persisted messages now. A running dispatcher does this on its own."""
+        if self._thread is None and self._store is not None:
+            self._retry_pass()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": sum(len(texts) for texts in self._pending.values()),
+                "in_flight": len(self._in_flight),
+                "backlog_recipients": len(self._backlog),
+            }
+
+    def _bucket(self, recipient: str) -> TokenBucket:
+        # caller holds the lock
+        bucket = self._buckets.get(recipient)
+        if bucket is None:
+            bucket = self._buckets[recipient] = TokenBucket(self._recipient_rate, self._recipient_burst)
+        return bucket
+
+    def _wait_time(self, recipient: str, now: float) -> float:
+        # caller holds the lock; takes both tokens when 0 is returned
+        wait = max(self._global.wait_time(now), self._bucket(recipient).wait_time(now))
+        if not wait:
+            self._global.take(now)
+            self._bucket(recipient).take(now)
+        return wait
+
+    def _acquire(self, recipient: str) -> None:
+        while True:
+            with self._cond:
+                wait = self._wait_time(recipient, time.monotonic())
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def _coalesce(self, texts: List[str]) -> List[str]:
+        bodies, current = [], ""
+        for text in texts:
+            if current and len(current) + len(SEPARATOR) + len(text) > MAX_TEXT_LENGTH:
+                bodies.append(current)
+                current = text
+            else:
+                current = current + SEPARATOR + text if current else text
+        bodies.append(current)
+        if len(texts) > len(bodies):
+            OUTBOUND_MESSAGES.inc(len(texts) - len(bodies), result="coalesced")
+        return bodies
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.retry_max, self.retry_base * (2 ** attempts))
+
+    def _post(self, recipient: str, body: str) -> Tuple[Optional[str], bool]:
+        # returns (error, retryable); error is None once the message is accepted
+        try:
+            self._client.post(self._build_payload(recipient, body))
+        except requests.HTTPError as e:
+            if e.response is None:
+                return str(e), True
+            return self._failure(e.response.status_code, e.response.headers.get("Retry-After"))
+        except requests.RequestException as e:
+            return str(e), True
+        return None, False
+
+    async def _post_async(self, client, recipient: str, body: str) -> Tuple[Optional[str], bool]:
+        try:
+            await client.post_async(self._build_payload(recipient, body))
+        except GraphAPIError as e:
+            if e.status is None:
+                return str(e), True
+            return self._failure(e.status, e.retry_after)
+        return None, False
+
+    def _failure(self, status: int, retry_after: Optional[str]) -> Tuple[str, bool]:
+        if status == 429:
+            try:
+                pause = float(retry_after)
+            except (TypeError, ValueError):
+                pause = self.retry_base
+            with self._cond:
+                self._global.pause(pause, time.monotonic())
+        return f"HTTP {status}", status == 429 or status >= 500
+
+    def _send_now(self, recipient: str, text: str) -> None:
+        with tracing.trace("outbound.send"):
+            if self._has_backlog(recipient):
+                # earlier failed replies go first, on the next retry_pending
+                self._persist(recipient, text, "queued behind earlier failures")
+                return
+            self._acquire(recipient)
+            error, retryable = self._post(recipient, text)
+            self._settle(recipient, text, error, retryable)
+
+    def _has_backlog(self, recipient: str) -> bool:
+        # inline mode has no long-lived view of the store; another instance may have persisted since
+        if self._store is None:
+            return False
+        try:
+            return self._store.has_outbound(recipient)
+        except Exception as e:
+            logging.error(f"Could not check queued messages for {recipient}: {e}")
+            return False
+
+    def _settle(self, recipient: str, body: str, error: Optional[str], retryable: bool) -> None:
+        if error is None:
+            OUTBOUND_MESSAGES.inc(result="sent")
+        elif retryable:
+            logging.warning(f"Message to {recipient} failed ({error}), queued for retry")
+            self._persist(recipient, body, error)
+        else:
+            OUTBOUND_MESSAGES.inc(result="dropped")
+            logging.error(f"Message to {recipient} rejected ({error}), dropping it")
+
+    def _persist(self, recipient: str, body: str, error: str) -> None:
+        if self._store is None:
+            OUTBOUND_MESSAGES.inc(result="dropped")
+            logging.error(f"No retry store, dropping message to {recipient}")
+            return
+        delay = self._backoff(0)
+        try:
+            self._store.queue_outbound(recipient, body, error, datetime.now(ZoneInfo("Asia/Jakarta")) + timedelta(seconds=delay))
+        except Exception as e:
+            OUTBOUND_MESSAGES.inc(result="dropped")
+            logging.error(f"Could not queue message to {recipient} for retry, dropping it: {e}")
+            return
+        OUTBOUND_MESSAGES.inc(result="queued")
+        with self._cond:
+            self._backlog.add(recipient)
+            self._requeued.add(recipient)
+            retry_at = time.monotonic() + delay
+            if self._next_retry is None or retry_at < self._next_retry:
+                self._next_retry = retry_at
+            self._cond.notify()
+
+    def _deliver(self, recipient: str, bodies: List[str], backlogged: bool, origin: Optional[str] = None) -> None:
+        try:
+            with tracing.trace("outbound.send", origin, backlogged=backlogged):
+                if backlogged:
+                    # older messages for this recipient are waiting in the store; keep the order
+                    for body in bodies:
+                        self._persist(recipient, body, "queued behind earlier failures")
+                else:
+                    error, retryable = self._post(recipient, bodies[0])
+                    self._settle(recipient, bodies[0], error, retryable)
+        except Exception as e:
+            logging.error(f"Error sending message to {recipient}: {e}")
+        finally:
+            self._done(recipient)
+
+    async def _deliver_async(self, client, recipient: str, body: str, origin: Optional[str] = None) -> None:
+        try:
+            with tracing.trace("outbound.send", origin):
+                error, retryable = await self._post_async(client, recipient, body)
+                if error is None:
+                    OUTBOUND_MESSAGES.inc(result="sent")
+                else:
+                    # persisting is a blocking DB write, keep it off the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, self._settle, recipient, body, error, retryable)
+        except Exception as e:
+            logging.error(f"Error sending message to {recipient}: {e}")
+        finally:
+            self._done(recipient, on_loop=True)
+
+    def _done(self, recipient: str, on_loop: bool = False) -> None:
+        with self._cond:
+            self._loop_jobs -= on_loop
+            self._done_locked(recipient)
+
+    def _done_locked(self, recipient: str) -> None:
+        # caller holds the lock
+        self._in_flight.discard(recipient)
+        if recipient in self._pending:
+            heapq.heappush(self._ready, (time.monotonic(), next(self._seq), recipient))
+        else:
+            self._origins.pop(recipient, None)
+        self._cond.notify_all()
+
+    def _retry_pass(self) -> None:
+        with self._cond:
+            self._requeued = set()
+        try:
+            rows = self._store.pending_outbound()
+        except Exception as e:
+            logging.error(f"Could not load queued outbound messages: {e}")
+            with self._cond:
+                self._backlog_loaded = True
+                self._next_retry = time.monotonic() + self.retry_base
+            return
+        with self._cond:
+            self._backlog.update(row[1] for row in rows)
+            self._backlog_loaded = True
+            self._cond.notify_all()
+
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
+        blocked, next_at = set(), None
+        for message_id, recipient, body, attempts, created_at, next_attempt_at in rows:
+            if self._closed:
+                break  # shutting down; the rest stay persisted for the next process
+            if recipient in blocked:
+                continue
+            try:
+                if created_at < now - self.max_age:
+                    self._store.delete_outbound(message_id)
+                    OUTBOUND_MESSAGES.inc(result="dropped")
+                    logging.warning(f"Dropping message to {recipient} queued since {created_at}")
+                    continue
+                if next_attempt_at > now:
+                    blocked.add(recipient)
+                    next_at = min(next_at or next_attempt_at, next_attempt_at)
+                    continue
+                self._acquire(recipient)
+                error, retryable = self._post(recipient, body)
+                if error is None or not retryable:
+                    self._store.delete_outbound(message_id)
+                    OUTBOUND_MESSAGES.inc(result="retried" if error is None else "dropped")
+                    if error:
+                        logging.error(f"Queued message to {recipient} rejected ({error}), dropping it")
+                    continue
+                retry_at = datetime.now(ZoneInfo("Asia/Jakarta")) + timedelta(seconds=self._backoff(attempts + 1))
+                self._store.defer_outbound(message_id, error, retry_at)
+            except Exception as e:
+                logging.error(f"Error retrying message to {recipient}: {e}")
+                retry_at = now + timedelta(seconds=self.retry_base)
+            blocked.add(recipient)
+            next_at = min(next_at or retry_at, retry_at)
+
+        with self._cond:
+            self._backlog -= {row[1] for row in rows} - blocked - self._requeued
+            if len(rows) >= 500:
+                delay = 0.0  # more rows than one pass reads
+            elif next_at is not None:
+                delay = max((next_at - datetime.now(ZoneInfo("Asia/Jakarta"))).total_seconds(), 0.0)
+            else:
+                delay = None
+            if delay is not None:
+                retry_at = time.monotonic() + delay
+                if self._next_retry is None or retry_at < self._next_retry:
+                    self._next_retry = retry_at
+
+    def _sender(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"Outbound sender error: {e}")
+
+    def _submit(self, func: Callable, *args) -> bool:
+        # False when no sender thread is left to run it
+        if not any(sender.is_alive() for sender in self._senders):
+            return False
+        self._jobs.put((func, args))
+        return True
+
+    def _requeue(self, recipient: str, bodies: List[str]) -> None:
+        # a job that could not be handed to a sender goes back in front, retried shortly; stop() persists it
+        with self._cond:
+            self._pending[recipient] = bodies + self._pending.get(recipient, [])
+            self._in_flight.discard(recipient)
+            heapq.heappush(self._ready, (time.monotonic() + 1.0, next(self._seq), recipient))
+            self._cond.notify_all()
+
+    def _run_retry_pass(self) -> None:
+        try:
+            self._retry_pass()
+        finally:
+            with self._cond:
+                self._retrying = False
+                self._cond.notify_all()
+
+    def _run(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            jobs = []
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                # persisted messages are looked up on first use, not at startup, so an idle app opens no connection
+                retry_due = (not self._backlog_loaded and self._pending) or (self._next_retry is not None and now >= self._next_retry)
+                if retry_due and not self._retrying and self._store is not None:
+                    self._retrying = True
+                    self._next_retry = None
+                    if not self._submit(self._run_retry_pass):
+                        self._retrying = False
+                        self._next_retry = now + self.retry_base
+                elif self._store is None:
+                    self._backlog_loaded = True
+
+                while self._backlog_loaded and self._ready and self._ready[0][0] <= now:
+                    _, _, recipient = heapq.heappop(self._ready)
+                    if recipient not in self._pending or recipient in self._in_flight:
+                        continue  # delivered already, or re-queued when the in-flight send finishes
+                    backlogged = recipient in self._backlog
+                    if not backlogged:
+                        wait = self._wait_time(recipient, now)
+                        if wait:
+                            heapq.heappush(self._ready, (now + wait, next(self._seq), recipient))
+                            continue
+                    bodies = self._coalesce(self._pending.pop(recipient))
+                    if not backlogged and len(bodies) > 1:
+                        # one message per token; the rest go back to the front of the queue
+                        self._pending[recipient] = bodies[1:]
+                    self._in_flight.add(recipient)
+                    # counted under the lock so detach_loop waits for every send it let through
+                    loop = None if backlogged else self._loop
+                    self._loop_jobs += loop is not None
+                    jobs.append((recipient, bodies, backlogged, loop, self._async_client, self._origins.get(recipient)))
+
+                if now - last_prune > 60:
+                    self._buckets = {r: b for r, b in self._buckets.items() if not b.idle(now)}
+                    last_prune = now
+
+                if not jobs:
+                    wake = [self._ready[0][0]] if self._ready and self._backlog_loaded else []
+                    if self._next_retry is not None:
+                        wake.append(self._next_retry)
+                    self._cond.wait(max(min(wake) - now, 0.001) if wake else None)
+                    continue
+
+            for recipient, bodies, backlogged, loop, client, origin in jobs:
+                if loop is not None:
+                    try:
+                        asyncio.run_coroutine_threadsafe(self._deliver_async(client, recipient, bodies[0], origin), loop)
+                        continue
+                    except RuntimeError:
+                        # loop already closed; fall back to the sender threads
+                        with self._cond:
+                            self._loop_jobs -= 1
+                if not self._submit(self._deliver, recipient, bodies, backlogged, origin):
+                    # only a backlogged job carries all the bodies; otherwise the rest are still pending
+                    self._requeue(recipient, bodies if backlogged else bodies[:1])
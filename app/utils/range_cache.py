@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class RangeCache:
+    """
+    LRU + TTL cache for values computed over one owner's time window.
+
+    Every entry remembers the ``(owner, start, end)`` window it was built from, so a
+    write at time ``t`` for an owner only drops that owner's entries whose window
+    contains ``t``. Other users and other days stay cached.
+
+    Invalidation only reaches this process; ``ttl <= 0`` turns the cache off for
+    deployments where another process may write.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._windows: Dict[Optional[str], Dict[Hashable, Tuple[datetime, datetime]]] = {}
+        # bumped on every invalidation so a load that raced with a write is not stored
+        self._generation: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _drop(self, key: Hashable) -> None:
+        # caller holds the lock
+        self._entries.pop(key, None)
+        owner = key[1]
+        windows = self._windows.get(owner)
+        if windows is not None:
+            windows.pop(key, None)
+            if not windows:
+                del self._windows[owner]
+
+    def get_or_load(self, kind: str, owner: Optional[str], start: datetime, end: datetime, loader: Callable[[], Any]):
+        if self.ttl <= 0:
+            return loader()
+        key = (kind, owner, start, end)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+            generation = self._generation.get(owner, 0)
+
+        value = loader()
+
+        with self._lock:
+            if self._generation.get(owner, 0) != generation:
+                return value
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._windows.setdefault(owner, {})[key] = (start, end)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self, owner: Optional[str], at: datetime) -> None:
+        """Drop ``owner``'s entries whose window contains ``at``."""
+        with self._lock:
+            self._generation[owner] = self._generation.get(owner, 0) + 1
+            windows = self._windows.get(owner)
+            if not windows:
+                return
+            stale = [key for key, (start, end) in windows.items() if start <= at < end]
+            for key in stale:
+                self._drop(key)
+            self._stats["invalidations"] += len(stale)
+
+    def invalidate_owner(self, owner: Optional[str]) -> None:
+        """Drop every entry of ``owner``, for changes that reach into any window (recurring schedules)."""
+        with self._lock:
+            self._generation[owner] = self._generation.get(owner, 0) + 1
+            stale = list(self._windows.get(owner, ()))
+            for key in stale:
+                self._drop(key)
+            self._stats["invalidations"] += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._windows.clear()
+            for owner in self._generation:
+                self._generation[owner] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        return stats
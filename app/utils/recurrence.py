@@ -0,0 +1,83 @@
+import calendar
+import re
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+from zoneinfo import ZoneInfo
+
+WEEKDAYS = {"senin": 0, "selasa": 1, "rabu": 2, "kamis": 3, "jumat": 4, "sabtu": 5, "minggu": 6}
+WEEKDAY_NAMES = {index: name for name, index in WEEKDAYS.items()}
+
+# "rapat jam 09:00 setiap senin sampai 30 november", "setiap hari", "setiap tanggal 5"
+RECURRING_LINE = re.compile(
+    r'^(?:tambah\s+)?(.+?)\s+jam\s+(\d{1,2}:\d{2})\s+setiap\s+(hari|' + "|".join(WEEKDAYS) + r'|tanggal\s+\d{1,2})'
+    r'(?:\s+sampai\s+(\d{1,2})\s+(\w+)(?:\s+(\d{4}))?)?$',
+    re.IGNORECASE,
+)
+
+# longest we search for a month that has the rule's day (a 31st skips at most one month in a row)
+_MONTH_SEARCH = 12
+
+
+def _occurrence(start: datetime, frequency: str, n: int) -> Optional[datetime]:
+    # n-th occurrence on the local wall clock, or None for a month without the rule's day
+    if frequency == "daily":
+        return start + timedelta(days=n)
+    if frequency == "weekly":
+        return start + timedelta(weeks=n)
+    month_index = start.month - 1 + n
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    if start.day > calendar.monthrange(year, month)[1]:
+        return None
+    return start.replace(year=year, month=month)
+
+
+def next_occurrence(
+    start: datetime, frequency: str, after: datetime, until: Optional[datetime] = None,
+    tz: ZoneInfo = ZoneInfo("Asia/Jakarta"), inclusive: bool = False,
+) -> Optional[datetime]:
+    """
+    First occurrence of the rule later than ``after`` (or at it, with ``inclusive``).
+
+    Jumps straight to the right period from the difference in days or months, so the
+    cost does not depend on how many occurrences lie between ``start`` and ``after``.
+    Returns None when the rule has ended by then.
+    """
+    start = start.astimezone(tz)
+    after = after.astimezone(tz)
+    if frequency == "monthly":
+        n = max((after.year - start.year) * 12 + after.month - start.month, 0)
+        limit = n + _MONTH_SEARCH + 1
+    else:
+        step = 1 if frequency == "daily" else 7
+        n = max((after.date() - start.date()).days // step, 0)
+        limit = n + 2
+    while n <= limit:
+        occurrence = _occurrence(start, frequency, n)
+        n += 1
+        if occurrence is None or occurrence < after or (occurrence == after and not inclusive):
+            continue
+        if until is not None and occurrence > until:
+            return None
+        return occurrence
+    return None
+
+
+def occurrences(
+    start: datetime, frequency: str, until: Optional[datetime], window_start: datetime, window_end: datetime,
+    tz: ZoneInfo = ZoneInfo("Asia/Jakarta"),
+) -> Iterator[datetime]:
+    """Occurrences in ``[window_start, window_end)``, in order, expanded on the fly."""
+    occurrence = next_occurrence(start, frequency, window_start, until, tz, inclusive=True)
+    while occurrence is not None and occurrence < window_end:
+        yield occurrence
+        occurrence = next_occurrence(start, frequency, occurrence, until, tz)
+
+
+def describe(frequency: str, start: datetime, tz: ZoneInfo = ZoneInfo("Asia/Jakarta")) -> str:
+    """How often the rule repeats, in the words the ``tambah`` command accepts."""
+    start = start.astimezone(tz)
+    if frequency == "daily":
+        return "setiap hari"
+    if frequency == "weekly":
+        return f"setiap {WEEKDAY_NAMES[start.weekday()]}"
+    return f"setiap tanggal {start.day}"
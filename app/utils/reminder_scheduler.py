@@ -0,0 +1,151 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+
+class ReminderScheduler:
+    """
+    Fires each reminder once, ``lead`` before its schedule starts.
+
+    Pending reminders inside ``horizon`` are loaded from the database into a
+    min-heap keyed by reminder time and a single thread sleeps until the head is
+    due. ScheduleManager notifies the scheduler after every committed mutation so
+    the heap follows adds, date changes and deletes without reloading. Firing
+    goes through ``ScheduleManager.claim_reminders``, which sets ``notified_at``
+    in the same statement, so a reminder is sent at most once across restarts,
+    processes and manual ``/check`` calls.
+
+    A recurring schedule takes part under its negated rule id with only its next
+    unsent occurrence; the following one is picked up by a later reload, which
+    runs every ``horizon / 2`` and so always before it is due.
+
+    The first load waits ``start_delay`` so creating the app opens no database
+    connection; changes made meanwhile are picked up by that load.
+    """
+
+    def __init__(
+        self,
+        manager,
+        notify: Callable[[List[Dict[str, str]]], None],
+        lead: timedelta = timedelta(minutes=35),
+        horizon: timedelta = timedelta(hours=24),
+        start_delay: timedelta = timedelta(0),
+    ):
+        self._manager = manager
+        self._notify = notify
+        self.lead = lead
+        self.horizon = horizon
+        self.start_delay = start_delay
+
+        self._heap: List[Tuple[datetime, int]] = []
+        self._due_at: Dict[int, datetime] = {}  # latest reminder time per schedule id; older heap entries are stale
+        self._loaded_until = None
+        self._pending_changes = None  # changes seen while a reload query is in flight
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+
+    def start(self) -> None:
+        self._manager.add_listener(self.on_change)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _now(self) -> datetime:
+        return datetime.now(ZoneInfo("Asia/Jakarta"))
+
+    def _push(self, schedule_id: int, scheduled_at: datetime) -> None:
+        # caller holds the lock
+        remind_at = scheduled_at - self.lead
+        self._due_at[schedule_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, schedule_id))
+
+    def _reload(self) -> None:
+        now = self._now()
+        until = now + self.horizon
+        with self._cond:
+            self._pending_changes = []
+        try:
+            rows = self._manager.get_pending_reminders(now, until)
+        finally:
+            with self._cond:
+                changes, self._pending_changes = self._pending_changes, None
+
+        with self._cond:
+            self._heap = []
+            self._due_at = {}
+            for schedule_id, scheduled_at in rows:
+                self._push(schedule_id, scheduled_at)
+            self._loaded_until = until
+            for change in changes:
+                self._apply(*change)
+        logging.info(f"Reminder scheduler loaded {len(rows)} pending reminders")
+
+    def on_change(self, event: str, schedule_id: int, scheduled_at) -> None:
+        with self._cond:
+            if self._pending_changes is not None:
+                self._pending_changes.append((event, schedule_id, scheduled_at))
+            self._apply(event, schedule_id, scheduled_at)
+            self._cond.notify()
+
+    def _apply(self, event: str, schedule_id: int, scheduled_at) -> None:
+        # caller holds the lock
+        if event == "removed" or scheduled_at is None:
+            self._due_at.pop(schedule_id, None)
+        elif self._loaded_until is not None and scheduled_at <= self._loaded_until:
+            self._push(schedule_id, scheduled_at)
+        else:
+            # outside the loaded window; the next reload picks it up
+            self._due_at.pop(schedule_id, None)
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        # caller holds the lock
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            remind_at, schedule_id = heapq.heappop(self._heap)
+            if self._due_at.get(schedule_id) == remind_at:
+                del self._due_at[schedule_id]
+                due.append(schedule_id)
+        return due
+
+    def _run(self) -> None:
+        with self._cond:
+            # stop() notifies, so shutting down does not wait out the delay
+            if not self._stopping and self.start_delay > timedelta(0):
+                self._cond.wait(self.start_delay.total_seconds())
+            if self._stopping:
+                return
+
+        while True:
+            try:
+                if self._loaded_until is None or self._now() >= self._loaded_until - self.horizon / 2:
+                    self._reload()
+
+                with self._cond:
+                    if self._stopping:
+                        return
+                    now = self._now()
+                    due = self._pop_due(now)
+                    if not due:
+                        next_reload = self._loaded_until - self.horizon / 2
+                        wake_at = min(self._heap[0][0], next_reload) if self._heap else next_reload
+                        self._cond.wait(max((wake_at - now).total_seconds(), 0.05))
+                        continue
+
+                upcoming = self._manager.claim_reminders(due, self._now() + self.lead)
+                if upcoming:
+                    self._notify(upcoming)
+            except Exception as e:
+                logging.error(f"Reminder scheduler error: {str(e)}")
+                with self._cond:
+                    self._loaded_until = None  # popped reminders may be lost, reload from the database
+                    if self._stopping:
+                        return
+                    self._cond.wait(30)
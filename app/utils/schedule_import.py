@@ -0,0 +1,174 @@
+import csv
+import io
+import re
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# (activity, scheduled_at) pairs ready for ScheduleManager.add_schedules
+Entry = Tuple[str, datetime]
+# ScheduleManager.build_schedule(time, date, month, activity, year) -> Entry, raising ValueError
+Builder = Callable[..., Entry]
+
+MAX_ITEMS = 500
+
+UNSUPPORTED_DOCUMENT = "Hanya file .csv atau .ics yang bisa diimpor"
+
+AGENDA_LINE = re.compile(
+    r'^(?:tambah\s+)?(.+?)\s+jam\s+(\d{1,2}:\d{2})(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$',
+    re.IGNORECASE,
+)
+BULLET = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s*')
+ISO_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+
+CSV_COLUMNS = {
+    "aktivitas": "activity", "activity": "activity", "kegiatan": "activity",
+    "jam": "time", "time": "time", "waktu": "time",
+    "tanggal": "date", "date": "date",
+    "bulan": "month", "month": "month",
+    "tahun": "year", "year": "year",
+}
+CSV_ORDER = ["activity", "time", "date", "month", "year"]
+
+
+def _limit(entries: List[Entry], errors: List[str]) -> Tuple[List[Entry], List[str]]:
+    if len(entries) > MAX_ITEMS:
+        errors.append(f"hanya {MAX_ITEMS} jadwal pertama yang diproses ({len(entries)} ditemukan)")
+        entries = entries[:MAX_ITEMS]
+    return entries, errors
+
+
+def parse_agenda(text: str, build: Builder) -> Tuple[List[Entry], List[str]]:
+    """One schedule per line, each in the ``tambah`` format (the keyword itself is optional)."""
+    entries, errors = [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = BULLET.sub("", line).strip().lower()
+        if not line:
+            continue
+        match = AGENDA_LINE.match(line)
+        if match is None:
+            errors.append(f"baris {number}: format salah")
+            continue
+        activity, time, date, month = match.groups()
+        try:
+            entries.append(build(time=time, date=date, month=month, activity=activity.strip()))
+        except ValueError as e:
+            errors.append(f"baris {number}: {e}")
+    return _limit(entries, errors)
+
+
+def parse_csv(text: str, build: Builder) -> Tuple[List[Entry], List[str]]:
+    """
+    Rows of activity, time, date[, month[, year]], optionally under a header naming
+    the columns (Indonesian or English). Months may be names or numbers, and a
+    date of the form YYYY-MM-DD fills in month and year.
+    """
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return [], []
+
+    header = [CSV_COLUMNS.get(cell.strip().lower()) for cell in rows[0]]
+    if "activity" in header and "time" in header:
+        columns, rows, first = header, rows[1:], 2
+    else:
+        columns, first = CSV_ORDER, 1
+
+    entries, errors = [], []
+    for number, row in enumerate(rows, first):
+        values = {name: cell.strip() for name, cell in zip(columns, row) if name and cell.strip()}
+        if not values:
+            continue
+        if "activity" not in values or "time" not in values:
+            errors.append(f"baris {number}: aktivitas dan jam wajib diisi")
+            continue
+        date, month, year = values.get("date"), values.get("month"), values.get("year")
+        iso = ISO_DATE.match(date or "")
+        if iso:
+            year, month, date = iso.groups()
+        try:
+            entries.append(build(
+                time=values["time"],
+                date=date,
+                month=month.lower() if month else None,
+                activity=values["activity"].lower(),
+                year=int(year) if year else None,
+            ))
+        except (ValueError, TypeError) as e:
+            errors.append(f"baris {number}: {e}")
+    return _limit(entries, errors)
+
+
+def _unfold(text: str) -> List[str]:
+    lines = []
+    for raw in text.splitlines():
+        if raw[:1] in (" ", "\t") and lines:
+            lines[-1] += raw[1:]
+        else:
+            lines.append(raw)
+    return lines
+
+
+def _ics_datetime(params: dict, value: str, tz: ZoneInfo) -> datetime:
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").replace(tzinfo=tz)
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=ZoneInfo("UTC")).astimezone(tz)
+    zone = tz
+    if "TZID" in params:
+        try:
+            zone = ZoneInfo(params["TZID"].strip('"'))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=zone).astimezone(tz)
+
+
+def parse_ics(text: str, tz: ZoneInfo = ZoneInfo("Asia/Jakarta")) -> Tuple[List[Entry], List[str]]:
+    """VEVENTs from an iCalendar file: SUMMARY becomes the activity, DTSTART the time."""
+    entries, errors = [], []
+    event: Optional[dict] = None
+    for line in _unfold(text):
+        if line == "BEGIN:VEVENT":
+            event = {}
+            continue
+        if line == "END:VEVENT" and event is not None:
+            summary, start = event.get("SUMMARY"), event.get("DTSTART")
+            if not summary or not start:
+                errors.append(f"acara tanpa {'SUMMARY' if not summary else 'DTSTART'} dilewati")
+            else:
+                try:
+                    entries.append((summary.lower(), _ics_datetime(start[0], start[1], tz)))
+                except ValueError:
+                    errors.append(f"{summary}: DTSTART tidak dikenali ({start[1]})")
+            event = None
+            continue
+        if event is None or ":" not in line:
+            continue
+        name, value = line.split(":", 1)
+        name, *params = name.split(";")
+        if name == "SUMMARY":
+            event["SUMMARY"] = value.replace("\\n", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\").strip()
+        elif name == "DTSTART":
+            event["DTSTART"] = (dict(p.split("=", 1) for p in params if "=" in p), value.strip())
+    return _limit(entries, errors)
+
+
+def document_kind(filename: Optional[str], mime_type: Optional[str]) -> Optional[str]:
+    """``"ics"``, ``"csv"`` or None for an upload, from the metadata alone so others are never downloaded."""
+    name = (filename or "").lower()
+    mime_type = (mime_type or "").lower()
+    if name.endswith(".ics") or "calendar" in mime_type:
+        return "ics"
+    if name.endswith(".csv") or "csv" in mime_type:
+        return "csv"
+    return None
+
+
+def parse_document(filename: str, mime_type: str, content: bytes, build: Builder) -> Tuple[List[Entry], List[str]]:
+    """Dispatch an uploaded file to the CSV or ICS parser by extension or MIME type."""
+    kind = document_kind(filename, mime_type)
+    if kind is None:
+        raise ValueError(UNSUPPORTED_DOCUMENT)
+    text = content.decode("utf-8-sig", errors="replace")
+    if kind == "ics":
+        return parse_ics(text)
+    return parse_csv(text, build)
@@ -0,0 +1,488 @@
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Optional
+from zoneinfo import ZoneInfo
+
+from app.utils.db_pool import ConnectionPool
+
+
+class Storage:
+    """
+    Where ScheduleManager's rows live.
+
+    A backend owns the connection pool and the schema; ScheduleManager writes
+    portable SQL with ``%s`` placeholders and timezone-aware datetimes and runs
+    it on whatever connection ``connection()`` hands out.
+    """
+
+    name = ""
+    IntegrityError = Exception
+
+    def __init__(self, connect: Callable, **pool_options):
+        self.pool = ConnectionPool(connect, **pool_options)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def begin(self, conn, write: bool = True) -> None:
+        """
+        Called when ScheduleManager.transaction() takes a connection, before the first
+        statement; ``write`` is False when the batch is known to only read.
+        """
+
+    def migrate(self, to_timestamp: Callable, default_owner: Optional[str], batch_size: int = 500) -> None:
+        raise NotImplementedError
+
+    def shift_days(self, column: str) -> str:
+        """SQL expression for ``column`` moved by a bound number of days (one ``%s`` parameter)."""
+        raise NotImplementedError
+
+    def _drop_duplicate_schedules(self, cursor) -> int:
+        # keeps the oldest row of each (owner_waid, activity, scheduled_at) so the unique index can be built
+        cursor.execute(
+            """
+            DELETE FROM schedules WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY owner_waid, activity, scheduled_at ORDER BY id) AS copy
+                    FROM schedules WHERE scheduled_at IS NOT NULL
+                ) AS numbered WHERE copy > 1
+            )
+            """
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def _pool_options():
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX", "5")),
+        "idle_timeout": float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+        "health_check_after": float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30")),
+        "acquire_timeout": float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10")),
+    }
+
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def __init__(self, **db_params):
+        import pg8000  # imported here so SQLite deployments never load the driver
+
+        self._driver = pg8000
+        self.IntegrityError = pg8000.IntegrityError
+        self._db_params = db_params
+        super().__init__(self._connect, **_pool_options())
+
+    @classmethod
+    def from_env(cls) -> "PostgresStorage":
+        return cls(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASS"),
+            host=os.getenv("DB_HOST"),
+            port=int(os.getenv("DB_PORT") or 5432),
+            database=os.getenv("DB_NAME"),
+        )
+
+    def _connect(self):
+        return self._driver.connect(**self._db_params)
+
+    def migrate(self, to_timestamp: Callable, default_owner: Optional[str], batch_size: int = 500) -> None:
+        """
+        Online migration from the TEXT (time, date, month) columns to a typed scheduled_at.
+
+        Columns are added as nullable, existing rows are backfilled in keyset batches
+        (one short transaction each) and the indexes are built CONCURRENTLY, so the
+        table stays writable throughout. The legacy TEXT columns are still written by
+        every mutation so an older deployment keeps working during a rollout.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedules (
+                    id SERIAL PRIMARY KEY,
+                    time TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    year INTEGER,
+                    scheduled_at TIMESTAMPTZ,
+                    owner_waid TEXT
+                )
+            ''')
+            cursor.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS year INTEGER")
+            cursor.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS scheduled_at TIMESTAMPTZ")
+            cursor.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS notified_at TIMESTAMPTZ")
+            cursor.execute("ALTER TABLE schedules ADD COLUMN IF NOT EXISTS owner_waid TEXT")
+            cursor.execute("DROP INDEX IF EXISTS schedules_sort_key_idx")
+            cursor.execute("DROP FUNCTION IF EXISTS schedule_sort_key(TEXT, TEXT, TEXT)")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processed_messages (
+                    message_id TEXT PRIMARY KEY,
+                    received_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbound_messages (
+                    id BIGSERIAL PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMPTZ NOT NULL,
+                    next_attempt_at TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedules_archive (
+                    id INTEGER NOT NULL,
+                    time TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    year INTEGER,
+                    scheduled_at TIMESTAMPTZ,
+                    notified_at TIMESTAMPTZ,
+                    owner_waid TEXT,
+                    archived_at TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recurring_schedules (
+                    id SERIAL PRIMARY KEY,
+                    owner_waid TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    starts_at TIMESTAMPTZ NOT NULL,
+                    until_at TIMESTAMPTZ,
+                    notified_through TIMESTAMPTZ,
+                    UNIQUE (owner_waid, activity)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS expiry_state (
+                    name TEXT PRIMARY KEY,
+                    watermark TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            conn.commit()
+
+        backfilled = self._backfill_scheduled_at(to_timestamp, batch_size)
+        if backfilled:
+            logging.info(f"Backfilled scheduled_at for {backfilled} schedules")
+
+        if default_owner:
+            backfilled = self._backfill_owner(default_owner, batch_size)
+            if backfilled:
+                logging.info(f"Assigned {backfilled} ownerless schedules to {default_owner}")
+
+        with self.connection() as conn:
+            removed = self._drop_duplicate_schedules(conn.cursor())
+            conn.commit()
+        if removed:
+            logging.info(f"Removed {removed} duplicate schedules")
+
+        with self.connection() as conn:
+            conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS schedules_scheduled_at_idx ON schedules (scheduled_at)"
+                )
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS schedules_owner_scheduled_at_idx ON schedules (owner_waid, scheduled_at)"
+                )
+                # a failed concurrent build leaves an INVALID index behind; drop it so IF NOT EXISTS retries
+                cursor.execute(
+                    """
+                    SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = 'schedules_owner_activity_scheduled_at_key' AND NOT i.indisvalid
+                    """
+                )
+                if cursor.fetchone():
+                    cursor.execute("DROP INDEX CONCURRENTLY schedules_owner_activity_scheduled_at_key")
+                cursor.execute(
+                    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS schedules_owner_activity_scheduled_at_key ON schedules (owner_waid, activity, scheduled_at)"
+                )
+                # superseded by the unique index above
+                cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS schedules_owner_activity_scheduled_at_idx")
+                cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS schedules_activity_scheduled_at_idx")
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS schedules_pending_reminder_idx ON schedules (scheduled_at) WHERE notified_at IS NULL"
+                )
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS processed_messages_received_at_idx ON processed_messages (received_at)"
+                )
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS schedules_archive_owner_scheduled_at_idx ON schedules_archive (owner_waid, scheduled_at)"
+                )
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS recurring_schedules_until_at_idx ON recurring_schedules (until_at) WHERE until_at IS NOT NULL"
+                )
+            finally:
+                conn.autocommit = False
+
+    def shift_days(self, column: str) -> str:
+        return f"{column} + make_interval(days => %s)"
+
+    def _backfill_owner(self, default_owner: str, batch_size: int) -> int:
+        total = 0
+        while True:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE schedules SET owner_waid = %s
+                    WHERE id IN (SELECT id FROM schedules WHERE owner_waid IS NULL LIMIT %s)
+                    """,
+                    (default_owner, batch_size)
+                )
+                updated = cursor.rowcount
+                conn.commit()
+            total += updated
+            if updated < batch_size:
+                return total
+
+    def _backfill_scheduled_at(self, to_timestamp: Callable, batch_size: int) -> int:
+        year = datetime.now(ZoneInfo("Asia/Jakarta")).year
+        last_id = 0
+        total = 0
+
+        while True:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT id, date, month, time FROM schedules WHERE scheduled_at IS NULL AND id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    return total
+
+                ids, timestamps = [], []
+                for _id, date_str, month_str, time_str in rows:
+                    last_id = _id
+                    try:
+                        timestamps.append(to_timestamp(year, date_str, month_str, time_str))
+                        ids.append(_id)
+                    except (ValueError, KeyError):
+                        logging.warning(f"Skipping schedule {_id} with unparseable date/time: {date_str} {month_str} {time_str}")
+
+                if ids:
+                    cursor.execute(
+                        """
+                        UPDATE schedules SET scheduled_at = src.ts, year = %s
+                        FROM unnest(%s::int[], %s::timestamptz[]) AS src(id, ts)
+                        WHERE schedules.id = src.id
+                        """,
+                        (year, ids, timestamps)
+                    )
+                    total += cursor.rowcount
+                conn.commit()
+
+
+# timestamps are stored as fixed-width UTC ISO text, so TEXT ordering is time ordering
+sqlite3.register_converter("TIMESTAMPTZ", lambda value: datetime.fromisoformat(value.decode()))
+
+
+def _to_sqlite(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat(sep=" ", timespec="microseconds")
+    return value
+
+
+@lru_cache(maxsize=256)
+def _to_qmark(sql: str) -> str:
+    # same text for the same query, so sqlite3's per-connection statement cache reuses the prepared statement
+    return sql.replace("%s", "?")
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(_to_qmark(sql), [_to_sqlite(value) for value in params])
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._cursor.executemany(_to_qmark(sql), ([_to_sqlite(value) for value in params] for params in seq_of_params))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class _SQLiteConnection:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self) -> _SQLiteCursor:
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded single-node backend: one database file in WAL mode, so readers never
+    wait for the writer and queries cost no network round-trip.
+    """
+
+    name = "sqlite"
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        if path == ":memory:":
+            raise ValueError("SQLiteStorage needs a file path; pooled connections cannot share a :memory: database")
+        self.path = path
+        self.busy_timeout = busy_timeout
+        super().__init__(self._connect, **_pool_options())
+
+    @classmethod
+    def from_env(cls) -> "SQLiteStorage":
+        return cls(os.getenv("SQLITE_PATH", "schedules.db"))
+
+    def _connect(self) -> _SQLiteConnection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # deferred: reads take no lock and a single write statement takes it when it runs, waiting
+            # up to busy_timeout; batches that read before writing ask begin() for BEGIN IMMEDIATE
+            isolation_level="DEFERRED",
+            check_same_thread=False,  # the pool hands a connection to one thread at a time
+            cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _SQLiteConnection(conn)
+
+    def begin(self, conn, write: bool = True) -> None:
+        # a deferred transaction that read first cannot wait for the lock when it later writes
+        # (SQLITE_BUSY right away if another writer committed meanwhile), so writers lock up front
+        conn.cursor().execute("BEGIN IMMEDIATE" if write else "BEGIN")
+
+    def shift_days(self, column: str) -> str:
+        # keeps the stored fixed-width text: date and time rewritten, ".ffffff+00:00" carried over
+        return f"strftime('%Y-%m-%d %H:%M:%S', {column}, %s || ' days') || substr({column}, 20)"
+
+    def migrate(self, to_timestamp: Callable, default_owner: Optional[str], batch_size: int = 500) -> None:
+        # no legacy TEXT-only rows to convert: the file is created with the current schema
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedules (
+                    id INTEGER PRIMARY KEY,
+                    time TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    year INTEGER,
+                    scheduled_at TIMESTAMPTZ,
+                    notified_at TIMESTAMPTZ,
+                    owner_waid TEXT
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processed_messages (
+                    message_id TEXT PRIMARY KEY,
+                    received_at TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbound_messages (
+                    id INTEGER PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMPTZ NOT NULL,
+                    next_attempt_at TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedules_archive (
+                    id INTEGER NOT NULL,
+                    time TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    year INTEGER,
+                    scheduled_at TIMESTAMPTZ,
+                    notified_at TIMESTAMPTZ,
+                    owner_waid TEXT,
+                    archived_at TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recurring_schedules (
+                    id INTEGER PRIMARY KEY,
+                    owner_waid TEXT NOT NULL,
+                    activity TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    starts_at TIMESTAMPTZ NOT NULL,
+                    until_at TIMESTAMPTZ,
+                    notified_through TIMESTAMPTZ,
+                    UNIQUE (owner_waid, activity)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS expiry_state (
+                    name TEXT PRIMARY KEY,
+                    watermark TIMESTAMPTZ NOT NULL
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS schedules_scheduled_at_idx ON schedules (scheduled_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS schedules_owner_scheduled_at_idx ON schedules (owner_waid, scheduled_at)")
+            self._drop_duplicate_schedules(cursor)
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS schedules_owner_activity_scheduled_at_key ON schedules (owner_waid, activity, scheduled_at)"
+            )
+            cursor.execute("DROP INDEX IF EXISTS schedules_owner_activity_scheduled_at_idx")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS schedules_pending_reminder_idx ON schedules (scheduled_at) WHERE notified_at IS NULL"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS processed_messages_received_at_idx ON processed_messages (received_at)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS schedules_archive_owner_scheduled_at_idx ON schedules_archive (owner_waid, scheduled_at)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS recurring_schedules_until_at_idx ON recurring_schedules (until_at) WHERE until_at IS NOT NULL"
+            )
+            conn.commit()
+
+
+BACKENDS = {"postgres": PostgresStorage, "sqlite": SQLiteStorage}
+
+
+def create_storage(name: Optional[str] = None) -> Storage:
+    """Build the backend named by ``name`` or the STORAGE_BACKEND env var (default ``postgres``)."""
+    name = (name or os.getenv("STORAGE_BACKEND") or "postgres").lower()
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected one of: {', '.join(BACKENDS)}")
+    return backend.from_env()
@@ -0,0 +1,281 @@
+"""
+Per-request tracing with an opt-in sampling profiler.
+
+A trace covers one unit of work (a webhook request, its processing on a worker,
+an outbound send) under a correlation ID taken from the WhatsApp message id, so
+the pieces of one conversation turn can be joined across threads. Spans opened
+while it runs, on the same thread or asyncio task, nest under it. Finished
+traces are appended to ``TRACE_FILE`` as JSON lines, one per span.
+
+With ``TRACE_PROFILE_MS`` set, a background thread samples the stacks of threads
+that are running a trace; a trace slower than that also gets a ``profile`` line
+with the sampled stacks collapsed (``file:function:line;...`` -> count).
+
+Tracing is off unless ``TRACE_FILE`` is set, and a span outside a trace costs one
+ContextVar lookup.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("tracing_span", default=None)
+
+MAX_STACK_DEPTH = 64
+
+
+class _Trace:
+    __slots__ = ("trace_id", "correlation_id", "spans")
+
+    def __init__(self, trace_id: str, correlation_id: Optional[str]):
+        self.trace_id = trace_id
+        self.correlation_id = correlation_id
+        self.spans: List["Span"] = []
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attrs", "start", "_t0", "duration", "thread")
+
+    def __init__(self, trace: _Trace, name: str, span_id: int, parent_id: Optional[int], attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.thread = threading.current_thread().name
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+        self.trace.spans.append(self)
+
+    def record(self) -> dict:
+        return {
+            "type": "span",
+            "trace_id": self.trace.trace_id,
+            "correlation_id": self.trace.correlation_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of watched threads every ``interval`` seconds via
+    ``sys._current_frames``. The sampler thread starts on the first ``watch`` and
+    sleeps while nothing is watched.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._watched: Dict[int, List[Counter]] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self) -> Counter:
+        """Start sampling the calling thread into the returned Counter."""
+        samples = Counter()
+        with self._cond:
+            self._watched.setdefault(threading.get_ident(), []).append(samples)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return samples
+
+    def unwatch(self, samples: Counter) -> None:
+        ident = threading.get_ident()
+        with self._cond:
+            watched = self._watched.get(ident, [])
+            if samples in watched:
+                watched.remove(samples)
+            if not watched:
+                self._watched.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._watched:
+                    self._cond.wait()
+                frames = sys._current_frames()
+                for ident, counters in self._watched.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = _collapse(frame)
+                    for samples in counters:
+                        samples[stack] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Tracer:
+    def __init__(self):
+        self.path = None
+        self.profile_threshold = None
+        self.profiler = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._prefix = f"{os.getpid():x}"
+
+    def configure(self, path: Optional[str], profile_threshold_ms: float = 0, profile_interval_ms: float = 5) -> None:
+        """Write traces to ``path`` (None turns tracing off) and profile traces slower than ``profile_threshold_ms``."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = path or None
+            self.profile_threshold = profile_threshold_ms / 1000 if path and profile_threshold_ms > 0 else None
+            if self.profile_threshold is not None and self.profiler is None:
+                self.profiler = SamplingProfiler(profile_interval_ms / 1000)
+            elif self.profiler is not None:
+                self.profiler.interval = profile_interval_ms / 1000
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @contextmanager
+    def trace(self, name: str, correlation_id: Optional[str] = None, **attrs):
+        """
+        Open a trace, or a child span when one is already running here (an inline
+        worker job inside the webhook request, say). Usable as a decorator too.
+        """
+        if self.path is None:
+            yield None
+            return
+        if _current.get() is not None:
+            with self.span(name, **attrs) as span:
+                if correlation_id and span.trace.correlation_id is None:
+                    span.trace.correlation_id = correlation_id
+                yield span
+            return
+
+        trace = _Trace(f"{self._prefix}-{next(self._ids):x}", correlation_id)
+        root = Span(trace, name, next(self._ids), None, attrs)
+        token = _current.set(root)
+        profiler = self.profiler if self.profile_threshold is not None else None
+        samples = profiler.watch() if profiler is not None else None
+        try:
+            yield root
+        except BaseException as e:
+            root.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            root.finish()
+            _current.reset(token)
+            if samples is not None:
+                profiler.unwatch(samples)
+                if root.duration < self.profile_threshold:
+                    samples = None
+            self._write(trace, root, samples)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, next(self._ids), parent.span_id, attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.finish()
+            _current.reset(token)
+
+    def _write(self, trace: _Trace, root: Span, samples: Optional[Counter]) -> None:
+        lines = [json.dumps(span.record(), default=str) for span in trace.spans]
+        if samples:
+            lines.append(json.dumps({
+                "type": "profile",
+                "trace_id": trace.trace_id,
+                "correlation_id": trace.correlation_id,
+                "name": root.name,
+                "duration_ms": round(root.duration * 1000, 3),
+                "interval_ms": self.profiler.interval * 1000,
+                "samples": sum(samples.values()),
+                "stacks": dict(samples.most_common()),
+            }))
+        try:
+            with self._lock:
+                if self.path is None:
+                    return
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+        except OSError as e:
+            logging.error(f"Could not write trace {trace.trace_id}: {e}")
+
+
+TRACER = Tracer()
+
+
+def configure(path: Optional[str], profile_threshold_ms: float = 0, profile_interval_ms: float = 5) -> None:
+    TRACER.configure(path, profile_threshold_ms, profile_interval_ms)
+
+
+def trace(name: str, correlation_id: Optional[str] = None, **attrs):
+    return TRACER.trace(name, correlation_id, **attrs)
+
+
+def span(name: str, **attrs):
+    return TRACER.span(name, **attrs)
+
+
+def set_correlation_id(correlation_id: Optional[str]) -> None:
+    """Name the running trace once the id is known (after the body is parsed, say)."""
+    current = _current.get()
+    if current is not None and correlation_id:
+        current.trace.correlation_id = correlation_id
+
+
+def current_correlation_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace.correlation_id if current is not None else None
+
+
+def traced(name: Optional[str] = None):
+    """Decorator wrapping each call in a span (only recorded inside a trace)."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with TRACER.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
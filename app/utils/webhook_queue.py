@@ -0,0 +1,122 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class WebhookWorkerPool:
+    """
+    In-process queues, one per worker thread, bounded together by ``max_queue``.
+
+    ``submit`` picks the queue from a key (the sender's WA ID), so one sender's
+    deliveries always run in order on the same worker while different senders
+    are handled in parallel. The bound is shared rather than split per worker,
+    so a worker that happens to own many busy senders does not start rejecting
+    while the pool as a whole has room. Each job runs inside the Flask app context so
+    handlers can keep using ``current_app``. ``submit`` never blocks the request
+    thread: when the queue is full it returns False and the caller answers with
+    a retryable status.
+    """
+
+    def __init__(self, app, handler: Callable[[Any], None], workers: int = 4, max_queue: int = 1000):
+        if workers < 1:
+            raise ValueError("WebhookWorkerPool needs at least one worker")
+
+        self._app = app
+        self._handler = handler
+        self._queues: "List[queue.Queue[Any]]" = [queue.Queue() for _ in range(workers)]
+        self._queued = 0  # events waiting in any queue, checked against max_queue
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_depth": 0,
+        }
+        self.max_queue = max_queue
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"webhook-worker-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _depth(self) -> int:
+        with self._lock:
+            return self._queued
+
+    def submit(self, body, key: Optional[str] = None) -> bool:
+        """Queue ``body`` on the worker that owns ``key``; bodies with the same key run in submission order."""
+        if self._stopping.is_set():
+            self._count("rejected")
+            return False
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                full = True
+            else:
+                self._queued += 1
+                self._stats["submitted"] += 1
+                self._stats["max_depth"] = max(self._stats["max_depth"], self._queued)
+                full = False
+        if full:
+            logging.warning(f"Webhook queue full ({self.max_queue}), rejecting delivery")
+            return False
+        self._queues[hash(key) % len(self._queues)].put_nowait((time.monotonic(), body))
+        return True
+
+    def _run(self, worker_queue: "queue.Queue[Any]") -> None:
+        while True:
+            item = worker_queue.get()
+            if item is None:
+                worker_queue.task_done()
+                return
+
+            with self._lock:
+                self._queued -= 1
+            enqueued_at, body = item
+            try:
+                with self._app.app_context():
+                    self._handler(body)
+                self._count("processed")
+            except Exception as e:
+                self._count("failed")
+                logging.error(f"Error processing webhook event: {str(e)}")
+            finally:
+                wait = time.monotonic() - enqueued_at
+                if wait > 5:
+                    logging.warning(f"Webhook event waited {wait:.1f}s before completing")
+                worker_queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["depth"] = self._depth()
+        stats["capacity"] = self.max_queue
+        stats["workers"] = sum(thread.is_alive() for thread in self._threads)
+        return stats
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop accepting events and wait for the queued ones to finish."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        logging.info(f"Draining webhook queue ({self._depth()} pending)")
+
+        deadline = time.monotonic() + timeout
+        for worker_queue in self._queues:
+            # sentinels go in behind the pending events, so everything queued is handled first
+            worker_queue.put_nowait(None)
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        pending = self._depth()
+        if pending:
+            logging.warning(f"Webhook queue drain timed out with {pending} events left")
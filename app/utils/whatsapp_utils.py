@@ -2,18 +2,17 @@ import logging
 from flask import current_app, jsonify
 import json
 import requests
-from app.database import ScheduleManager
-import re
-import pg8000
-from datetime import datetime 
+from app.database import DuplicateScheduleError, get_manager
+from app.utils import tracing
+from app.utils.command_router import CommandRouter
+from app.utils.outbound import MAX_TEXT_LENGTH
+from app.utils.recurrence import RECURRING_LINE, describe
+from app.utils.schedule_import import AGENDA_LINE, UNSUPPORTED_DOCUMENT, document_kind, parse_agenda, parse_document
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import List, Union
 from zoneinfo import ZoneInfo
 
-def log_http_response(response):
-    logging.info(f"Status: {response.status_code}")
-    logging.info(f"Content-type: {response.headers.get('content-type')}")
-    logging.info(f"Body: {response.text}")
-
-
 def get_text_message_input(recipient, text):
     return json.dumps(
         {
@@ -25,13 +24,16 @@ def get_text_message_input(recipient, text):
         }
     )
 
+@tracing.trace("check")
 def async_checking():
     try:
         current_time = datetime.now(ZoneInfo("Asia/Jakarta")).strftime("%Y-%m-%d %H:%M:%S")
         logging.info(f"{current_time} : Running schedule check ")
         
-        schedule_data = manager.check_schedules()
+        schedule_data = get_manager().check_schedules(timedelta(minutes=current_app.config["REMINDER_LEAD_MINUTES"]))
         process_schedule_data(schedule_data)
+        # without sender threads (serverless) this poll is also what retries failed sends
+        current_app.extensions["outbound"].retry_pending()
         return jsonify({"status": "success", "message": "sending data"}), 200
         
     except Exception as e:
@@ -45,12 +47,20 @@ def process_schedule_data(schedule_data):
             return
         
         logging.info(f"Found schedules - Upcoming: {len(upcoming_schedules)}")
-        try:
-            current_message = format_schedule_message(upcoming_schedules)
-            logging.info(f"Sending notification for current schedules: {upcoming_schedules}")
-            send_schedule_notification(current_message)
-        except Exception as e:
-            logging.error(f"Error processing current schedules: {str(e)}")
+
+        # one batched message per recipient
+        by_owner = {}
+        for schedule in upcoming_schedules:
+            owner = schedule.get("owner") or current_app.config["RECIPIENT_WAID"]
+            by_owner.setdefault(owner, []).append(schedule)
+
+        for owner, schedules in by_owner.items():
+            try:
+                current_message = format_schedule_message(schedules)
+                logging.info(f"Sending notification for {len(schedules)} schedules to {owner}")
+                send_schedule_notification(current_message, owner)
+            except Exception as e:
+                logging.error(f"Error processing current schedules: {str(e)}")
 
 def format_schedule_message(schedules):
     header = "⚠️ *JADWAL MENDATANG :*\n\n"
@@ -63,103 +73,160 @@ def format_schedule_message(schedules):
     
     return message
     
-def send_schedule_notification(message):
+def send_schedule_notification(message, recipient=None):
     try:
-        data = get_text_message_input(recipient=current_app.config['RECIPIENT_WAID'], text=message)
-        send_message(data)
+        send_text(recipient or current_app.config['RECIPIENT_WAID'], message)
         # logging.info("Schedule notification sent successfully")
     except Exception as e:
         logging.error(f"Failed to send schedule notification: {str(e)}")
 
 
 
-manager = ScheduleManager()
-def generate_response(message_body: str) -> str:
-    message_body = message_body.lower()
+router = CommandRouter()
+def generate_response(message_body: str, owner: str = None) -> Union[str, List[str]]:
+    return router.dispatch(message_body, get_manager(), owner)
 
-    if message_body.startswith('tambah'):
-        return process_add_command(message_body, manager)
-    if message_body.startswith(('jadwal hari ini', 'hari ini')):
-        return today(manager)
-    if message_body.startswith(('jadwal minggu ini', 'minggu ini')):
-        return week(manager)
-    if message_body.startswith(('ganti nama', 'update nama')):
-        return update_name(message_body, manager)
-    if message_body.startswith(('ganti tanggal', 'update tanggal')):
-        return update_date(message_body, manager)
-    if message_body.startswith('hapus'):
-        return delete_activity(message_body, manager)
-        
 
+def send_text(recipient, text):
+    # paced, coalesced and retried by the app's OutboundDispatcher
+    current_app.extensions["outbound"].send(recipient, text)
 
-def send_message(data):
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}",
-    }
 
-    url = f"https://graph.facebook.com/{current_app.config['VERSION']}/{current_app.config['PHONE_NUMBER_ID']}/messages"
+def process_whatsapp_message(body):
+    process_whatsapp_messages(list(iter_messages(body)))
+
 
+def fetch_document(document):
+    # downloaded before the DB transaction starts so no connection is held during the transfer;
+    # files we cannot import are answered from their metadata without downloading them
+    if document_kind(document.get("filename"), document.get("mime_type")) is None:
+        return None
     try:
-        response = requests.post(
-            url, data=data, headers=headers, timeout=10
-        )  # 10 seconds timeout as an example
-        response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
-    except requests.Timeout:
-        logging.error("Timeout occurred while sending message")
-        return jsonify({"status": "error", "message": "Request timed out"}), 408
-    except (
-        requests.RequestException
-    ) as e:  # This will catch any general request exception
-        logging.error(f"Request failed due to: {e}")
-        return jsonify({"status": "error", "message": "Failed to send message"}), 500
-    else:
-        # Process the response as normal
-        log_http_response(response)
-        return response
+        return current_app.extensions["graph_client"].download_media(document["id"])
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logging.error(f"Failed to download document {document.get('filename')}: {e}")
+        return None
+
+
+def import_document(document, content, manager, owner):
+    if document_kind(document.get("filename"), document.get("mime_type")) is None:
+        return UNSUPPORTED_DOCUMENT
+    if content is None:
+        return "Gagal mengunduh file. Coba kirim ulang."
+    try:
+        entries, errors = parse_document(document.get("filename"), document.get("mime_type"), content, manager.build_schedule)
+    except ValueError as e:
+        return str(e)
+    if not entries:
+        return format_import_summary([], [], errors or ["tidak ada jadwal di dalam file"])
+    added, duplicates = manager.add_schedules(entries, owner)
+    return format_import_summary(added, duplicates, errors)
+
+
+def correlation_id(messages):
+    # traces of one delivery (request, worker, replies) are joined on its first message id
+    return next((message.get("id") for message in messages if message.get("id")), None)
+
+
+def process_whatsapp_messages(messages):
+    with tracing.trace("webhook.process", correlation_id(messages), messages=len(messages)):
+        _process_whatsapp_messages(messages)
+
+
+def _process_whatsapp_messages(messages):
+    # every command from one delivery shares a single DB transaction; replies go out
+    # only after it commits so nobody is told a change succeeded before it is durable
+    documents = {
+        message.get("id"): fetch_document(message["document"])
+        for message in messages
+        if message.get("type") == "document" and message.get("document")
+    }
+
+    # deliveries of lookups only do not need to wait for the write lock
+    write = bool(documents) or not all(
+        router.is_read_only(message.get("text", {}).get("body") or "") for message in messages
+    )
+    responses = []
+    manager = get_manager()
+    with manager.transaction(write=write):
+        for message in messages:
+            if message.get("id") in documents:
+                sender = message.get("from") or current_app.config["RECIPIENT_WAID"]
+                responses.append((sender, import_document(message["document"], documents[message.get("id")], manager, sender)))
+                continue
+            message_body = message.get("text", {}).get("body")
+            if message_body is None:
+                logging.info(f"Skipping non-text message of type {message.get('type')}")
+                continue
+            # each sender only sees and edits their own schedules, and gets the reply
+            sender = message.get("from") or current_app.config["RECIPIENT_WAID"]
+            responses.append((sender, generate_response(message_body, sender)))
+
+    for sender, response in responses:
+        # long agendas come back as several messages, sent in order
+        for text in [response] if isinstance(response, str) else response:
+            send_text(sender, text)
 
-def process_whatsapp_message(body):
-    message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-    message_body = message["text"]["body"]
 
-    response = generate_response(message_body)
+def iter_changes(body):
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value")
+            if value:
+                yield value
 
-    data = get_text_message_input(current_app.config["RECIPIENT_WAID"], response)
-    send_message(data)
+
+def iter_messages(body):
+    for value in iter_changes(body):
+        yield from value.get("messages") or []
+
+
+def iter_statuses(body):
+    for value in iter_changes(body):
+        yield from value.get("statuses") or []
 
 
 def is_valid_whatsapp_message(body):
     """
     Check if the incoming webhook event has a valid WhatsApp message structure.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
-    )
+    return bool(body.get("object")) and any(iter_messages(body))
 
 
 
 # command list
-def process_add_command(message_body, manager):
-    pattern = r'^tambah(\s+.+?)\s+jam\s+(\d{1,2}:\d{2})(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$'
-    match = re.match(pattern, message_body, re.IGNORECASE)
-    
-    if not match:
-        return "Format pesan salah. Contoh: *Tambah [aktivitas] jam [HH:MM] tanggal [(Opsional)] [Bulan (Opsional)]*"
-    
+ADD_USAGE = (
+    "Format pesan salah. Contoh: *Tambah [aktivitas] jam [HH:MM] tanggal [(Opsional)] [Bulan (Opsional)]*\n"
+    "Untuk banyak jadwal sekaligus, tulis satu jadwal per baris setelah *Tambah*.\n"
+    "Untuk jadwal rutin: *Tambah [aktivitas] jam [HH:MM] setiap [hari/senin/.../tanggal DD] sampai [DD Bulan (Opsional)]*"
+)
+DB_CONFLICT = "Jadwal tidak bisa disimpan karena bentrok dengan data lain. Silakan coba lagi."
+
+@router.command('tambah', pattern=r'(?s)^tambah\s+(.+)$', usage=ADD_USAGE)
+def process_add_command(match, manager, owner):
+    lines = [line for line in match.group(1).splitlines() if line.strip()]
+    if len(lines) > 1:
+        return process_bulk_add(match.group(1), manager, owner)
+
+    recurring = RECURRING_LINE.match(lines[0].strip())
+    if recurring is not None:
+        return process_recurring_add(recurring, manager, owner)
+
+    match = AGENDA_LINE.match(lines[0].strip())
+    if match is None:
+        return ADD_USAGE
     activity = match.group(1).strip()
     time = match.group(2).strip()
     date = match.group(3).strip() if match.group(3) else None
     month = match.group(4).strip() if match.group(4) else None
 
     try:
-        response = manager.add_schedule(time=time, date=date, month=month, activity=activity)
-    except pg8000.IntegrityError as e:
-        response = f"DB constraint error: {e}"
+        response = manager.add_schedule(time=time, date=date, month=month, activity=activity, owner=owner)
+    except DuplicateScheduleError:
+        response = f"Jadwal '{activity}' sudah ada pada waktu tersebut."
+    except manager.storage.IntegrityError as e:
+        logging.error(f"Constraint violation adding '{activity}' for {owner}: {e}")
+        response = DB_CONFLICT
     except ValueError as e:
         response = f"Validation error: {e}"
     except Exception as e:
@@ -167,112 +234,235 @@ def process_add_command(message_body, manager):
     
     return response
 
-def today(manager): 
-    day_info, schedules = manager.get_today_schedules()
+def process_recurring_add(match, manager, owner):
+    activity, time, every, until_date, until_month, until_year = match.groups()
+    activity = activity.strip()
+    try:
+        return manager.add_recurring(
+            time=time, every=every, activity=activity, until_date=until_date, until_month=until_month,
+            until_year=int(until_year) if until_year else None, owner=owner,
+        )
+    except DuplicateScheduleError:
+        return f"Jadwal rutin '{activity}' sudah ada. Hapus dulu dengan *hapus rutin {activity}*."
+    except manager.storage.IntegrityError as e:
+        logging.error(f"Constraint violation adding recurring '{activity}' for {owner}: {e}")
+        return DB_CONFLICT
+    except ValueError as e:
+        return f"Validation error: {e}"
+    except Exception as e:
+        return f"Unexpected error: {e}"
+
+def process_bulk_add(text, manager, owner):
+    entries, errors = parse_agenda(text, manager.build_schedule)
+    if not entries:
+        return ADD_USAGE
+    try:
+        added, duplicates = manager.add_schedules(entries, owner)
+    except manager.storage.IntegrityError as e:
+        logging.error(f"Constraint violation importing schedules for {owner}: {e}")
+        return DB_CONFLICT
+    return format_import_summary(added, duplicates, errors)
 
-    if schedules:
-        response = f"Jadwal untuk {day_info}:\n"
-        for time, activity in schedules:
-            response += f"- {time}: {activity}\n"
-    else:
-        response = f"Tidak ada jadwal untuk {day_info}"
-        
-    return response
+def format_import_summary(added, duplicates, errors):
+    def describe(activity, scheduled_at):
+        local = scheduled_at.astimezone(ZoneInfo("Asia/Jakarta"))
+        return f"- {local.day}/{local.month} {local.strftime('%H:%M')} {activity}"
 
-def week(manager): 
-    all_schedules = manager.get_weekly_schedules()
-        
-    if not all_schedules:
-        return "Tidak ada jadwal untuk minggu ini."
-    
-    grouped_schedules = {}
-    for time, activity, date, month in all_schedules:
-        day_key = f"{date} {month}"
-        if day_key not in grouped_schedules:
-            grouped_schedules[day_key] = []
-        grouped_schedules[day_key].append((time, activity))
-    
-    # Menyusun respons
-    response = "Jadwal minggu ini:\n\n"
-    for day_key, schedules in grouped_schedules.items():
-        response += f"🗓️ {day_key}:\n"
-        for time, activity in schedules:
-            response += f"⏰ {time} - {activity}\n"
-        response += "\n"
-    
-    return response.strip()
+    sections = []
+    if added:
+        sections.append("\n".join([f"✅ {len(added)} jadwal ditambahkan:"] + [describe(*entry) for entry in added]))
+    if duplicates:
+        sections.append("\n".join([f"⚠️ {len(duplicates)} jadwal sudah ada:"] + [describe(*entry) for entry in duplicates]))
+    if errors:
+        sections.append("\n".join([f"❌ {len(errors)} tidak valid:"] + [f"- {error}" for error in errors]))
+    return "\n\n".join(sections) or "Tidak ada jadwal yang ditambahkan."
 
-def update_name(message_body, manager): 
-    pattern = r'^(?:ganti nama|update nama)\s+(.+?)\s+menjadi\s+(.+?)(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$'
-    match = re.match(pattern, message_body, re.IGNORECASE)
-    
-    if not match:
-        return "Format pesan salah. Contoh: *ganti nama [aktivitas lama] menjadi [aktivitas baru] tanggal [DD (Opsional)] [Bulan (Opsional)]*"
-    
+@router.command('jadwal hari ini', 'hari ini', read_only=True)
+def today(match, manager, owner): 
+    start, end = manager.today_range()
+    return manager.cached_view(
+        "reply-today", owner, start, end,
+        lambda: format_day_schedules(manager.day_label(start), manager.iter_range(start, end, owner)),
+    )
+
+@router.command('jadwal minggu ini', 'minggu ini', read_only=True)
+def week(match, manager, owner): 
+    start, end = manager.week_range()
+    return manager.cached_view(
+        "reply-week", owner, start, end,
+        lambda: format_grouped_schedules("Jadwal minggu ini:", manager.iter_range(start, end, owner))
+        or "Tidak ada jadwal untuk minggu ini.",
+    )
+
+@router.command('jadwal bulan ini', 'bulan ini', read_only=True)
+def month(match, manager, owner): 
+    start, end = manager.month_range()
+    return manager.cached_view(
+        "reply-month", owner, start, end,
+        lambda: format_grouped_schedules("Jadwal bulan ini:", manager.iter_range(start, end, owner))
+        or "Tidak ada jadwal untuk bulan ini.",
+    )
+
+def format_day_schedules(day_info, schedules):
+    lines = (f"- {time}: {activity}" for time, activity, _, _ in schedules)
+    messages = pack_messages(None, [(f"Jadwal untuk {day_info}:", f"Jadwal untuk {day_info} (lanjutan):", lines)])
+    return messages or f"Tidak ada jadwal untuk {day_info}"
+
+def format_grouped_schedules(title, all_schedules):
+    # rows arrive ordered by scheduled_at, so consecutive rows share a day
+    days = (
+        (f"🗓️ {date} {month}:", f"🗓️ {date} {month} (lanjutan):", (f"⏰ {time} - {activity}" for time, activity, _, _ in rows))
+        for (date, month), rows in groupby(all_schedules, key=lambda row: (row[2], row[3]))
+    )
+    return pack_messages(title, days)
+
+def pack_messages(title, blocks, limit=MAX_TEXT_LENGTH):
+    """
+    Lay out ``(header, continued_header, lines)`` blocks as WhatsApp messages of at most ``limit`` characters.
+
+    Blocks are separated by a blank line and a message only breaks between blocks,
+    unless one block alone is too long; it is then split between lines and carries
+    on under ``continued_header``. A single line too long for any message is cut
+    into pieces. Everything is built from list buffers as the
+    lines are consumed. Returns an empty list when there are no lines.
+    """
+    messages, parts, size = [], [], 0
+    for header, continued, lines in blocks:
+        if not messages and not parts and title:
+            parts, size = [title], len(title)
+        # the first block shares its message with the title rather than leave the title on its own
+        first_limit = limit - size - 2 if parts == [title] else limit
+        for block in _split_block(header, continued, lines, first_limit, limit):
+            if parts and size + 2 + len(block) > limit:
+                messages.append("\n\n".join(parts))
+                parts, size = [], 0
+            size += len(block) + (2 if parts else 0)
+            parts.append(block)
+    # a title whose blocks had no lines is not a message of its own
+    if parts and parts != [title]:
+        messages.append("\n\n".join(parts))
+    return messages
+
+def _split_block(header, continued, lines, first_limit, limit):
+    # a line that could not fit under a header even alone (a huge activity name) is cut into pieces that do
+    width = limit - max(len(header), len(continued)) - 1
+    buffer, size = [header], len(header)
+    for line in lines:
+        pieces = [line[i:i + width] for i in range(0, len(line), width)] if len(line) > width else [line]
+        for piece in pieces:
+            if len(buffer) > 1 and size + 1 + len(piece) > first_limit:
+                yield "\n".join(buffer)
+                buffer, size, first_limit = [continued], len(continued), limit
+            buffer.append(piece)
+            size += 1 + len(piece)
+    if len(buffer) > 1:
+        yield "\n".join(buffer)
+
+@router.command(
+    'ganti nama', 'update nama',
+    pattern=r'^(?:ganti nama|update nama)\s+(.+?)\s+menjadi\s+(.+?)(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$',
+    usage="Format pesan salah. Contoh: *ganti nama [aktivitas lama] menjadi [aktivitas baru] tanggal [DD (Opsional)] [Bulan (Opsional)]*",
+)
+def update_name(match, manager, owner): 
     old_activity = match.group(1).strip()
     new_activity = match.group(2).strip()
     date = match.group(3).strip() if match.group(3) else None
     month = match.group(4).strip() if match.group(4) else None
     
     try:
-        success = manager.update_activity_name( activity=old_activity, date=date, month=month, new_activity=new_activity)
+        success = manager.update_activity_name( activity=old_activity, date=date, month=month, new_activity=new_activity, owner=owner)
         if success:
             return f"Jadwal '{old_activity}' berhasil diubah menjadi '{new_activity}'."
         else:
             return f"Jadwal '{old_activity}' tidak ditemukan."
+    except DuplicateScheduleError:
+        return f"Jadwal '{new_activity}' sudah ada pada waktu tersebut."
     except ValueError as e:
         return f"Validation error: {e}"
     except Exception as e:
         return f"Unexpected error: {e}"
     
-def update_date(message_body, manager): 
-    pattern = r'^(?:ganti tanggal|update tanggal)\s+(.+?)\s+dari\s+(\d{1,2})\s+menjadi\s+(\d{1,2})(?:\s+(\w+))?$'
-    match = re.match(pattern, message_body, re.IGNORECASE)
-    
-    if not match:
-        return "Format pesan salah. Contoh: *ganti tanggal [aktivitas] dari [tanggal lama] menjadi [tanggal baru] [Bulan (Opsional)]*"
-    
+@router.command(
+    'ganti tanggal', 'update tanggal',
+    pattern=r'^(?:ganti tanggal|update tanggal)\s+(.+?)\s+dari\s+(\d{1,2})\s+menjadi\s+(\d{1,2})(?:\s+(\w+))?$',
+    usage="Format pesan salah. Contoh: *ganti tanggal [aktivitas] dari [tanggal lama] menjadi [tanggal baru] [Bulan (Opsional)]*",
+)
+def update_date(match, manager, owner): 
     activity = match.group(1).strip()
     old_date = match.group(2).strip()
     new_date = match.group(3).strip()
     month = match.group(4).strip().lower() if match.group(4) else None
     
     try:
-        success = manager.update_schedule_time(activity=activity, date=old_date, new_date=new_date, month=month)
+        success = manager.update_schedule_time(activity=activity, date=old_date, new_date=new_date, month=month, owner=owner)
         if success:
             return f"Jadwal '{activity}' berhasil diubah dari tanggal {old_date} ke tanggal {new_date}."
         else:
             return f"Jadwal '{activity}' pada tanggal {old_date} tidak ditemukan."
             
+    except DuplicateScheduleError:
+        return f"Jadwal '{activity}' sudah ada pada tanggal {new_date}."
     except ValueError as e:
         return f"Validation error: {e}"
     except Exception as e:
         return f"Unexpected error: {e}"
     
-def delete_activity(message_body, manager):
-    pattern = r'^hapus\s+(.+?)(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$'
-    match = re.match(pattern, message_body, re.IGNORECASE)
-    
-    if not match:
-        return "Format pesan salah. Contoh: *hapus [aktivitas] tanggal [(Opsional)] [Bulan (Opsional)]*"
-    
+@router.command(
+    'hapus',
+    pattern=r'^hapus\s+(.+?)(?:\s+tanggal\s+(\d{1,2})(?:\s+(\w+))?)?$',
+    usage="Format pesan salah. Contoh: *hapus [aktivitas] tanggal [(Opsional)] [Bulan (Opsional)]*",
+)
+def delete_activity(match, manager, owner):
     activity = match.group(1).strip()
     date = match.group(2).strip() if match.group(2) else None 
     month = match.group(3).strip() if match.group(3) else None
 
     try:
-        success = manager.remove_activity(activity=activity, date=date, month=month)
+        success = manager.remove_activity(activity=activity, date=date, month=month, owner=owner)
         if success :
             result_message = f"Aktivitas '{activity}' berhasil dihapus."
             return result_message
         else:
             return f"Aktivitas '{activity}' tidak ditemukan."
 
-    except pg8000.IntegrityError as e:
-        response = f"DB constraint error: {e}"
+    except manager.storage.IntegrityError as e:
+        logging.error(f"Constraint violation deleting '{activity}' for {owner}: {e}")
+        response = DB_CONFLICT
     except ValueError as e:
         response = f"Validation error: {e}"
     except Exception as e:
         response = f"Unexpected error: {e}"
     
     return response
+
+@router.command('jadwal rutin', read_only=True)
+def recurring(match, manager, owner):
+    rules = manager.get_recurring(owner)
+    if not rules:
+        return "Tidak ada jadwal rutin."
+    lines = []
+    for activity, frequency, starts_at, until_at in rules:
+        line = f"🔁 {activity} - {describe(frequency, starts_at)} pukul {starts_at.astimezone(ZoneInfo('Asia/Jakarta')).strftime('%H:%M')}"
+        if until_at is not None:
+            until_at = until_at.astimezone(ZoneInfo("Asia/Jakarta"))
+            line += f" sampai {until_at.day}/{until_at.month}/{until_at.year}"
+        lines.append(line)
+    return pack_messages(None, [("Jadwal rutin:", "Jadwal rutin (lanjutan):", lines)])
+
+@router.command(
+    'hapus rutin',
+    pattern=r'^hapus rutin\s+(.+)$',
+    usage="Format pesan salah. Contoh: *hapus rutin [aktivitas]*",
+)
+def delete_recurring(match, manager, owner):
+    activity = match.group(1).strip()
+    try:
+        if manager.remove_recurring(activity=activity, owner=owner):
+            return f"Jadwal rutin '{activity}' berhasil dihapus."
+        return f"Jadwal rutin '{activity}' tidak ditemukan."
+    except Exception as e:
+        return f"Unexpected error: {e}"
+
+@router.command('bantuan', 'help', read_only=True)
+def help_command(match, manager, owner):
+    return router.help()
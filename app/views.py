@@ -1,51 +1,101 @@
 import logging
 import json
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 
 from .decorators.security import signature_required
+from .utils import metrics, tracing
 from .utils.whatsapp_utils import (
     async_checking,
-    process_whatsapp_message,
+    iter_messages,
+    iter_statuses,
+    correlation_id,
+    process_whatsapp_messages,
     is_valid_whatsapp_message,
 )
 
 webhook_blueprint = Blueprint("webhook", __name__)
 
 def handle_message():
-    body = request.get_json()
-    # logging.info(f"request body: {body}")
-
-    # Check if it's a WhatsApp status update
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
-        logging.info("Received a WhatsApp status update.")
-        return jsonify({"status": "ok"}), 200
-
     try:
-        if is_valid_whatsapp_message(body):
-            process_whatsapp_message(body)
-            return jsonify({"status": "ok"}), 200
-        else:
-            # if the request is not a WhatsApp API event, return an error
-            return (
-                jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
-                404,
-            )
-    except json.JSONDecodeError:
+        body = json.loads(request.get_data())
+    except ValueError:  # JSONDecodeError, or bytes that are not UTF-8
         logging.error("Failed to decode JSON")
         return jsonify({"status": "error", "message": "Invalid JSON provided"}), 400
+    payload, status = handle_webhook_event(body)
+    return jsonify(payload), status
+
+
+def handle_webhook_event(body):
+    """
+    Route one signed webhook delivery; returns ``(json_payload, status)``.
+
+    Shared by the Flask view and the aiohttp server (app/aio.py); needs an app context.
+    """
+    if not isinstance(body, dict):
+        logging.error("Webhook body is not a JSON object")
+        return {"status": "error", "message": "Invalid JSON provided"}, 400
+
+    # Check if it's a WhatsApp status update
+    statuses = sum(1 for _ in iter_statuses(body))
+    if statuses:
+        logging.info(f"Received {statuses} WhatsApp status update(s).")
+
+    if is_valid_whatsapp_message(body):
+        tracing.set_correlation_id(correlation_id(iter_messages(body)))
+        dedup = current_app.extensions["dedup"]
+        messages = []
+        for message in iter_messages(body):
+            if dedup.is_duplicate(message.get("id")):
+                logging.info(f"Dropping redelivered message {message.get('id')}")
+            else:
+                messages.append(message)
+        if not messages:
+            return {"status": "ok"}, 200
+
+        workers = current_app.extensions.get("webhook_workers")
+        if workers is None:
+            try:
+                process_whatsapp_messages(messages)
+            except Exception:
+                # the 500 makes Meta redeliver; without this the retry would be dropped as a duplicate
+                for message in messages:
+                    dedup.forget(message.get("id"))
+                raise
+            return {"status": "ok"}, 200
+
+        # one job per sender, on that sender's worker, so their commands apply in the order sent
+        by_sender = {}
+        for message in messages:
+            by_sender.setdefault(message.get("from"), []).append(message)
+        busy = False
+        for sender, sender_messages in by_sender.items():
+            if not workers.submit(sender_messages, key=sender):
+                busy = True
+                # not queued; forget the ids so Meta's redelivery is processed
+                for message in sender_messages:
+                    dedup.forget(message.get("id"))
+        if busy:
+            # queue is full; a non-2xx makes Meta redeliver later instead of us dropping it
+            return {"status": "error", "message": "Busy, retry later"}, 503
+        return {"status": "ok"}, 200
+    elif statuses:
+        return {"status": "ok"}, 200
+    else:
+        # if the request is not a WhatsApp API event, return an error
+        return {"status": "error", "message": "Not a WhatsApp API event"}, 404
 
 
 # Required webhook verification for WhatsApp
 def verify():
-    # Parse params from the webhook verification request
-    mode = request.args.get("hub.mode")
-    token = request.args.get("hub.verify_token")
-    challenge = request.args.get("hub.challenge")
+    response, status = verify_subscription(request.args)
+    return (response if isinstance(response, str) else jsonify(response)), status
+
+
+def verify_subscription(args):
+    # Parse params from the webhook verification request; returns (challenge text or JSON payload, status)
+    mode = args.get("hub.mode")
+    token = args.get("hub.verify_token")
+    challenge = args.get("hub.challenge")
     # Check if a token and mode were sent
     if mode and token:
         # Check the mode and token sent are correct
@@ -56,11 +106,11 @@ def verify():
         else:
             # Responds with '403 Forbidden' if verify tokens do not match
             logging.info("VERIFICATION_FAILED")
-            return jsonify({"status": "error", "message": "Verification failed"}), 403
+            return {"status": "error", "message": "Verification failed"}, 403
     else:
         # Responds with '400 Bad Request' if verify tokens do not match
         logging.info("MISSING_PARAMETER")
-        return jsonify({"status": "error", "message": "Missing parameters"}), 400
+        return {"status": "error", "message": "Missing parameters"}, 400
 
 
 #endpoint
@@ -72,7 +122,12 @@ def webhook_get():
 def check():
     return async_checking()
 
+@webhook_blueprint.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 @webhook_blueprint.route("/webhook", methods=["POST"])
+@tracing.trace("webhook")
 @signature_required
 def webhook_post():
     return handle_message()
@@ -0,0 +1,130 @@
+import hashlib
+import hmac
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return float("nan")
+    rank = max(math.ceil(pct / 100 * len(samples)), 1)
+    return samples[rank - 1]
+
+
+def summarize(name: str, samples: Iterable[float], elapsed: float = None) -> Dict[str, float]:
+    samples = sorted(samples)
+    result = {
+        "name": name,
+        "n": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": samples[-1] * 1000 if samples else float("nan"),
+    }
+    if elapsed:
+        result["rps"] = len(samples) / elapsed
+    return result
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    columns = ["name", "n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rps"]
+    print(" ".join(f"{c:>14}" if c != "name" else f"{c:<28}" for c in columns))
+    for row in rows:
+        cells = []
+        for c in columns:
+            value = row.get(c, "")
+            if c == "name":
+                cells.append(f"{value:<28}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>14.3f}")
+            else:
+                cells.append(f"{value:>14}")
+        print(" ".join(cells))
+
+
+def sign(secret: str, body: bytes) -> str:
+    """``X-Hub-Signature-256`` header value, as Meta computes it."""
+    return "sha256=" + hmac.new(secret.encode("latin-1"), body, hashlib.sha256).hexdigest()
+
+
+def webhook_payload(message_id: str, sender: str, text: str) -> bytes:
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "0", "phone_number_id": "bench"},
+                    "contacts": [{"profile": {"name": "bench"}, "wa_id": sender}],
+                    "messages": [{
+                        "from": sender,
+                        "id": message_id,
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }).encode("utf-8")
+
+
+class StubGraphServer:
+    """
+    Stand-in for the Graph API messages endpoint.
+
+    Accepts every POST with a canned 200 reply (optionally after ``delay`` seconds)
+    and counts what it received, so outbound sends cost a loopback round-trip
+    instead of a call to Meta.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub._lock:
+                    stub.received += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = b'{"messaging_product":"whatsapp","messages":[{"id":"wamid.bench"}]}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
@@ -0,0 +1,260 @@
+"""
+Microbenchmarks for the hot paths behind chat commands.
+
+    router   resolve + argument parsing for a mix of commands (no database)
+    signature  X-Hub-Signature-256 verification of a single message and of a large batched delivery
+    clean    clean_outdated_activities archiving 10k and 100k expired rows
+    weekly   get_weekly_schedules, uncached and cached, and the uncached "minggu ini" reply
+    batch    one delivery of chat commands in a single transaction(), with the SQL statements
+             (round trips) it sends
+
+``clean``, ``weekly`` and ``batch`` write to the configured storage backend (STORAGE_BACKEND,
+DB_* or SQLITE_PATH) and ``clean`` archives every expired schedule in it, so use a
+throwaway database.
+
+    python -m benchmarks.micro router signature weekly
+    python -m benchmarks.micro clean --clean-rows 10000 100000
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from benchmarks.common import print_table, summarize
+
+MESSAGES = [
+    "tambah rapat tim jam 09:30 tanggal 12 januari",
+    "jadwal hari ini",
+    "minggu ini",
+    "bulan ini",
+    "ganti nama rapat tim menjadi rapat divisi tanggal 12 januari",
+    "ganti tanggal rapat divisi dari 12 menjadi 14 januari",
+    "hapus rapat divisi tanggal 14",
+    "bantuan",
+    "apa kabar",
+]
+
+
+def seed(manager, owner, timestamps, chunk=1000):
+    """Insert one schedule per timestamp, ``chunk`` rows per statement (works on every storage backend)."""
+    rows = []
+    for i, ts in enumerate(timestamps):
+        time_, day, month = manager._render(ts)
+        rows.append((time_, str(day), month, ts.year, ts, f"bench {i}", owner))
+    with manager._get_connection() as conn:
+        cursor = conn.cursor()
+        for offset in range(0, len(rows), chunk):
+            batch = rows[offset:offset + chunk]
+            cursor.execute(
+                "INSERT INTO schedules (time, date, month, year, scheduled_at, activity, owner_waid) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch)),
+                [value for row in batch for value in row],
+            )
+        conn.commit()
+
+
+def purge(manager, owner):
+    with manager._get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM schedules WHERE owner_waid = %s", (owner,))
+        conn.commit()
+    manager.range_cache.clear()
+
+
+def open_manager():
+    from app.database import ScheduleManager
+
+    manager = ScheduleManager()
+    manager.migrate()
+    return manager
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self):
+        return _CountingCursor(self._conn.cursor(), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def count_statements(manager):
+    """Count every statement sent through ``manager``'s storage; returns the one-item counter list."""
+    counter = [0]
+    connection = manager.storage.connection
+
+    @contextmanager
+    def counting():
+        with connection() as conn:
+            yield _CountingConnection(conn, counter)
+
+    manager.storage.connection = counting
+    return counter
+
+
+def bench_router(args):
+    from app.utils.whatsapp_utils import router
+
+    samples = {message.split()[0]: [] for message in MESSAGES}
+    for _ in range(args.iterations):
+        for message in MESSAGES:
+            start = time.perf_counter()
+            command = router.resolve(message)
+            if command is not None and command.pattern is not None:
+                command.pattern.match(message)
+            samples[message.split()[0]].append(time.perf_counter() - start)
+    return [summarize(f"router {word}", values) for word, values in samples.items()]
+
+
+def bench_signature(args):
+    from app.decorators.security import SignatureVerifier
+    from benchmarks.common import sign, webhook_payload
+
+    verifier = SignatureVerifier(["bench-secret", "bench-secret-old"])
+    small = webhook_payload("wamid.sig", "6280000000000", "hari ini")
+    # a delivery batching many messages, as Meta sends under load
+    large = small.replace(b'"messages": [', b'"messages": [' + b", ".join([small] * 200) + b", ", 1)
+    rows = []
+    for name, body, secret in [("1 msg", small, "bench-secret"), ("200 msgs", large, "bench-secret"),
+                               ("200 msgs old key", large, "bench-secret-old")]:
+        header = sign(secret, body)
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            if not verifier.validate(body, header):
+                raise RuntimeError("signature did not verify")
+            samples.append(time.perf_counter() - start)
+        rows.append(summarize(f"sig {name} {len(body) // 1024}KiB", samples))
+    return rows
+
+
+def bench_clean(args):
+    manager = open_manager()
+    owner = f"bench-clean-{os.getpid()}"
+    now = datetime.now(ZoneInfo("Asia/Jakarta"))
+    rows = []
+    for count in args.clean_rows:
+        samples = []
+        for _ in range(args.repeat):
+            seed(manager, owner, [now - timedelta(minutes=i + 1) for i in range(count)])
+            start = time.perf_counter()
+            removed = manager.clean_outdated_activities(force=True)
+            samples.append(time.perf_counter() - start)
+            if removed < count:
+                raise RuntimeError(f"expected at least {count} expired rows, removed {removed}")
+        rows.append(summarize(f"clean {count} rows", samples))
+    return rows
+
+
+def bench_weekly(args):
+    from app.utils.whatsapp_utils import format_grouped_schedules
+
+    manager = open_manager()
+    owner = f"bench-week-{os.getpid()}"
+    start_of_week, end_of_week = manager.week_range()
+    step = (end_of_week - start_of_week) / args.week_rows
+    seed(manager, owner, [start_of_week + step * i for i in range(args.week_rows)])
+    try:
+        cold, warm = [], []
+        for _ in range(args.iterations // 10 or 1):
+            manager.range_cache.clear()
+            start = time.perf_counter()
+            manager.get_weekly_schedules(owner)
+            cold.append(time.perf_counter() - start)
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            manager.get_weekly_schedules(owner)
+            warm.append(time.perf_counter() - start)
+        reply = []
+        for _ in range(args.iterations // 10 or 1):
+            start = time.perf_counter()
+            format_grouped_schedules("Jadwal minggu ini:", manager.iter_range(start_of_week, end_of_week, owner))
+            reply.append(time.perf_counter() - start)
+    finally:
+        purge(manager, owner)
+    return [
+        summarize(f"weekly {args.week_rows} rows uncached", cold),
+        summarize(f"weekly {args.week_rows} rows cached", warm),
+        summarize(f"weekly {args.week_rows} rows reply", reply),
+    ]
+
+
+def bench_batch(args):
+    manager = open_manager()
+    owner = f"bench-batch-{os.getpid()}"
+    counter = count_statements(manager)
+    now = datetime.now(ZoneInfo("Asia/Jakarta"))
+    month = manager._month_names[now.month]
+    # a busy delivery: adds (one a duplicate), a rename, a date shift onto a taken day, a lookup
+    commands = [
+        lambda: manager.add_schedule("09:00", 10, month, "rapat", now.year, owner=owner),
+        lambda: manager.add_schedule("10:00", 10, month, "makan", now.year, owner=owner),
+        lambda: manager.add_schedule("09:00", 12, month, "rapat", now.year, owner=owner),
+        lambda: manager.add_schedule("09:00", 10, month, "rapat", now.year, owner=owner),
+        lambda: manager.update_activity_name("makan", 10, month, "makan siang", owner=owner),
+        lambda: manager.update_schedule_time("rapat", 10, 12, month, owner=owner),
+        lambda: manager.get_range(now.replace(day=10, hour=0), now.replace(day=11, hour=0), owner),
+        lambda: manager.remove_activity("makan siang", 10, month, owner=owner),
+    ]
+    samples, statements = [], []
+    try:
+        for _ in range(args.iterations // 10 or 1):
+            purge(manager, owner)
+            counter[0] = 0
+            start = time.perf_counter()
+            with manager.transaction():
+                for command in commands:
+                    try:
+                        command()
+                    except ValueError:
+                        pass
+            samples.append(time.perf_counter() - start)
+            statements.append(counter[0])
+    finally:
+        purge(manager, owner)
+    return [summarize(f"batch {len(commands)} cmds {max(statements)} stmts", samples)]
+
+
+BENCHMARKS = {"router": bench_router, "signature": bench_signature, "clean": bench_clean, "weekly": bench_weekly,
+              "batch": bench_batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", metavar="name", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per clean size")
+    parser.add_argument("--clean-rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--week-rows", type=int, default=200)
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+
+    rows = []
+    for name in args.names or BENCHMARKS:
+        rows.extend(BENCHMARKS[name](args))
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
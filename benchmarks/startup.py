@@ -0,0 +1,120 @@
+"""
+Cold-start benchmark.
+
+Starts ``--runs`` fresh interpreters per configuration and times ``import app``,
+``create_app()`` and the first webhook. It also counts outbound socket
+connections made before that first request, and those the reminder scheduler
+opens until its response; both should be zero in either configuration:
+
+* ``serverless``: configured like the Vercel deployment (no background workers,
+  no reminder thread); the first webhook reads the database inline.
+* ``default``: the out-of-the-box settings, with the webhook worker pool and the
+  reminder scheduler running; the first webhook returns once it is queued.
+
+The schema is created once up front with ``python -m app.migrate``, using the
+configured storage backend (STORAGE_BACKEND, DB_* or SQLITE_PATH).
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import print_table, summarize
+
+CHILD = r"""
+import json, socket, threading, time
+
+connects = 0
+scheduler = 0
+_connect = socket.socket.connect
+def counting_connect(self, *args):
+    global connects, scheduler
+    connects += 1
+    if threading.current_thread().name == "reminder-scheduler":
+        scheduler += 1
+    return _connect(self, *args)
+socket.socket.connect = counting_connect
+
+from benchmarks.common import StubGraphServer, sign, webhook_payload
+
+with StubGraphServer() as graph:
+    import os
+    os.environ["GRAPH_BASE_URL"] = graph.base_url
+    connects = scheduler = 0
+
+    t0 = time.perf_counter()
+    import app
+    t1 = time.perf_counter()
+    flask_app = app.create_app()
+    t2 = time.perf_counter()
+    before_request = connects
+
+    body = webhook_payload("wamid.startup", "6280000000000", "hari ini")
+    response = flask_app.test_client().post(
+        "/webhook", data=body,
+        headers={"Content-Type": "application/json", "X-Hub-Signature-256": sign(flask_app.config["APP_SECRET"], body)},
+    )
+    t3 = time.perf_counter()
+    scheduler_before_response = scheduler
+    # let queued work finish while the stub Graph API is still up
+    workers = flask_app.extensions.get("webhook_workers")
+    if workers is not None:
+        workers.shutdown(10)
+    flask_app.extensions["outbound"].stop()
+
+print(json.dumps({
+    "import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2,
+    "connects_before_request": before_request, "scheduler_connects": scheduler_before_response,
+    "status": response.status_code,
+}))
+"""
+
+# settings that differ between the two; anything else set in the environment applies to both
+CONFIG_KEYS = ("WEBHOOK_ASYNC", "OUTBOUND_ASYNC", "REMINDER_SCHEDULER")
+CONFIGS = {
+    "serverless": {"WEBHOOK_ASYNC": "false", "REMINDER_SCHEDULER": "false"},
+    "default": {},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("APP_SECRET", "bench-secret")
+    env.setdefault("ACCESS_TOKEN", "bench-token")
+    env.setdefault("VERSION", "v18.0")
+    env.setdefault("PHONE_NUMBER_ID", "bench")
+
+    subprocess.run([sys.executable, "-m", "app.migrate"], env=env, check=True, capture_output=True)
+
+    for config, overrides in CONFIGS.items():
+        config_env = {key: value for key, value in env.items() if key not in CONFIG_KEYS}
+        config_env.update(overrides)
+        phases = {"import": [], "create_app": [], "first_request": []}
+        connects, scheduler, statuses = set(), set(), set()
+        for _ in range(args.runs):
+            result = subprocess.run([sys.executable, "-c", CHILD], env=config_env, check=True, capture_output=True, text=True)
+            sample = json.loads(result.stdout.strip().splitlines()[-1])
+            for phase in phases:
+                phases[phase].append(sample[phase])
+            connects.add(sample["connects_before_request"])
+            scheduler.add(sample["scheduler_connects"])
+            statuses.add(sample["status"])
+
+        rows = [summarize(phase, samples) for phase, samples in phases.items()]
+        rows.append(summarize("total", [sum(values) for values in zip(*phases.values())]))
+        print(
+            f"config={config} runs={args.runs} connections_before_first_request={sorted(connects)}"
+            f" scheduler_connections={sorted(scheduler)} first_request_status={sorted(statuses)}"
+        )
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Load test for POST /webhook.
+
+Builds the app with ``create_app()``, serves it through waitress on a loopback
+port and replays signed WhatsApp deliveries from ``--users`` concurrent senders.
+Replies go to a local stub Graph API server. Each sender owns its own WA ID and
+runs add -> views -> rename -> delete, so the run leaves no schedules behind.
+
+Uses the configured storage backend (STORAGE_BACKEND, DB_* or SQLITE_PATH);
+point it at a throwaway database. By default webhooks are processed inline so
+the measured latency covers the command itself; pass ``--async`` to measure the
+ACK path of the background worker queue instead, and ``--server aiohttp`` to
+serve through the asyncio mode (app/aio.py) instead of waitress.
+
+    python -m benchmarks.webhook_load --users 8 --rounds 20
+    python -m benchmarks.webhook_load --users 64 --rounds 5 --async --server aiohttp
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+
+from benchmarks.common import StubGraphServer, print_table, sign, summarize, webhook_payload
+
+SCRIPT = [
+    ("tambah", "tambah {name} jam 23:00"),
+    ("hari ini", "hari ini"),
+    ("minggu ini", "minggu ini"),
+    ("bulan ini", "bulan ini"),
+    ("ganti nama", "ganti nama {name} menjadi {name}x"),
+    ("hapus", "hapus {name}x"),
+    ("bantuan", "bantuan"),
+    ("unknown", "apa kabar"),
+]
+
+
+def configure_env(args, graph_url: str) -> None:
+    os.environ["GRAPH_BASE_URL"] = graph_url
+    os.environ.setdefault("APP_SECRET", "bench-secret")
+    os.environ.setdefault("ACCESS_TOKEN", "bench-token")
+    os.environ.setdefault("VERSION", "v18.0")
+    os.environ.setdefault("PHONE_NUMBER_ID", "bench")
+    os.environ["REMINDER_SCHEDULER"] = "false"
+    os.environ["WEBHOOK_ASYNC"] = "true" if args.use_async else "false"
+    os.environ["GRAPH_POOL_SIZE"] = str(max(args.users, 10))
+    # Meta's pacing limits would throttle the replies and cap the measured rate; export them to measure with them on
+    os.environ.setdefault("OUTBOUND_RATE", "0")
+    os.environ.setdefault("OUTBOUND_RECIPIENT_PER_MINUTE", "0")
+
+
+def serve_aiohttp(app):
+    # runs the aiohttp app on its own loop thread; returns the bound port
+    from aiohttp import web
+    from app.aio import create_aio_app
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_aio_app(app))
+
+    async def start():
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    port = loop.run_until_complete(start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return port, lambda: asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(30)
+
+
+def run_user(base_url, secret, user_index, rounds, results, lock):
+    sender = f"6280{os.getpid() % 10000:04d}{user_index:05d}"
+    session = requests.Session()
+    local = defaultdict(list)
+    errors = 0
+    for round_index in range(rounds):
+        name = f"bench{user_index}r{round_index}"
+        for label, template in SCRIPT:
+            body = webhook_payload(f"wamid.{uuid.uuid4().hex}", sender, template.format(name=name))
+            headers = {"Content-Type": "application/json", "X-Hub-Signature-256": sign(secret, body)}
+            start = time.perf_counter()
+            response = session.post(f"{base_url}/webhook", data=body, headers=headers)
+            local[label].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+    with lock:
+        for label, samples in local.items():
+            results[label].extend(samples)
+        results["_errors"].append(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="concurrent senders")
+    parser.add_argument("--rounds", type=int, default=10, help="script iterations per sender")
+    parser.add_argument("--threads", type=int, default=8, help="waitress worker threads")
+    parser.add_argument("--graph-delay", type=float, default=0.0, help="stub Graph API latency in seconds")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="measure the background-queue ACK path")
+    parser.add_argument("--server", choices=["waitress", "aiohttp"], default="waitress")
+    args = parser.parse_args()
+
+    with StubGraphServer(delay=args.graph_delay) as graph:
+        configure_env(args, graph.base_url)
+
+        from waitress import create_server
+        from app import create_app
+        from app.database import get_manager
+
+        app = create_app()
+        get_manager(app).migrate()
+        stop_server = None
+        if args.server == "aiohttp":
+            port, stop_server = serve_aiohttp(app)
+        else:
+            server = create_server(app, host="127.0.0.1", port=0, threads=args.threads)
+            threading.Thread(target=server.run, daemon=True).start()
+            port = server.effective_port
+        base_url = f"http://127.0.0.1:{port}"
+
+        results = defaultdict(list)
+        lock = threading.Lock()
+        users = [
+            threading.Thread(target=run_user, args=(base_url, app.config["APP_SECRET"], i, args.rounds, results, lock))
+            for i in range(args.users)
+        ]
+        started = time.perf_counter()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - started
+
+        workers = app.extensions.get("webhook_workers")
+        if workers is not None:
+            workers.shutdown(60)
+        if stop_server is not None:
+            stop_server()
+        app.extensions["outbound"].stop(60)
+        # waitress has no clean stop for a running server; its daemon thread ends with the process
+
+    errors = sum(results.pop("_errors", []))
+    rows = [summarize(label, results[label], elapsed) for label, _ in SCRIPT]
+    rows.append(summarize("all", [s for samples in results.values() for s in samples], elapsed))
+    print(f"server={args.server} users={args.users} rounds={args.rounds} async={args.use_async} elapsed={elapsed:.2f}s "
+          f"errors={errors} graph_sends={graph.received}")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
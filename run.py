@@ -1,5 +1,7 @@
 import logging
 import os
+import signal
+import sys
 from app import create_app
 from waitress import serve
 
@@ -9,8 +11,18 @@ app = create_app()
 if __name__ == "__main__":
     logging.info("App Online")
     port = int(os.environ.get("PORT", 8080))
-    
-    serve(app, host='0.0.0.0', port=port)
+
+    # turn SIGTERM into a normal exit so atexit hooks drain the webhook queue
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    if app.config["SERVER"] == "aiohttp":
+        from aiohttp import web
+        from app.aio import create_aio_app
+
+        # run_app handles SIGTERM itself and returns, so the atexit hooks still drain
+        web.run_app(create_aio_app(app), host='0.0.0.0', port=port, print=None)
+    else:
+        serve(app, host='0.0.0.0', port=port)
     
 
 
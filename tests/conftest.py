@@ -0,0 +1,43 @@
+import uuid
+
+import pytest
+
+from app.database import ScheduleManager
+
+BACKENDS = ["sqlite", "postgres"]
+
+
+@pytest.fixture(params=BACKENDS)
+def manager(request, tmp_path, monkeypatch):
+    """A migrated ScheduleManager on each backend; Postgres uses the DB_* env vars and is skipped when unreachable."""
+    monkeypatch.setenv("STORAGE_BACKEND", request.param)
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "schedules.db"))
+    monkeypatch.setenv("DB_POOL_ACQUIRE_TIMEOUT", "2")
+    monkeypatch.setenv("EXPIRY_BATCH_SIZE", "2")
+    monkeypatch.delenv("RECIPIENT_WAID", raising=False)
+
+    manager = ScheduleManager()
+    try:
+        manager.migrate()
+    except Exception as e:
+        manager.close()
+        if request.param == "postgres":
+            pytest.skip(f"Postgres unavailable: {e}")
+        raise
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def owner(manager):
+    """
+    A WA ID no other test uses, so tests can share a Postgres database. Rows of it,
+    and of IDs derived from it (``f"{owner}-other"``), are removed afterwards.
+    """
+    waid = f"test-{uuid.uuid4().hex[:12]}"
+    yield waid
+    with manager.storage.connection() as conn:
+        cursor = conn.cursor()
+        for table in ("schedules", "schedules_archive", "recurring_schedules"):
+            cursor.execute(f"DELETE FROM {table} WHERE owner_waid LIKE %s", (f"{waid}%",))
+        conn.commit()
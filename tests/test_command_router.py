@@ -0,0 +1,34 @@
+import pytest
+
+from app.utils.command_router import CommandRouter
+
+
+@pytest.fixture
+def router():
+    router = CommandRouter()
+
+    @router.command('jadwal hari ini', 'hari ini', read_only=True)
+    def today(match, manager, owner):
+        return "today"
+
+    @router.command('hapus', pattern=r'^hapus\s+(.+)$', usage="usage")
+    def remove(match, manager, owner):
+        return f"remove {match.group(1)}"
+
+    return router
+
+
+@pytest.mark.parametrize("message", ["hari ini", "Hari ini?", "hari ini ?!", "  jadwal hari ini.\n"])
+def test_trailing_punctuation_is_ignored(router, message):
+    assert router.dispatch(message, None) == "today"
+
+
+def test_punctuation_inside_arguments_is_kept(router):
+    assert router.dispatch("hapus rapat: tim, pagi.", None) == "remove rapat: tim, pagi"
+    assert router.dispatch("hapus ?", None) == "usage"
+
+
+def test_read_only_commands(router):
+    assert router.is_read_only("Hari ini?")
+    assert router.is_read_only("apa kabar")  # answered with help
+    assert not router.is_read_only("hapus rapat")
@@ -0,0 +1,211 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+import requests
+
+from app.utils.outbound import MAX_TEXT_LENGTH, SEPARATOR, OutboundDispatcher
+
+
+def _http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return requests.HTTPError(response=response)
+
+
+class FakeClient:
+    """Records posted ``(recipient, body)`` pairs; ``failures`` holds errors to raise, one per post."""
+
+    def __init__(self, failures=(), delay=0.0):
+        self.sent = []
+        self.failures = list(failures)
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def post(self, payload):
+        time.sleep(self.delay)
+        with self._lock:
+            if self.failures:
+                error = self.failures.pop(0)
+                if error is not None:
+                    raise error
+            self.sent.append(payload)
+
+
+class MemoryStore:
+    """The outbound half of ScheduleManager, in memory."""
+
+    def __init__(self):
+        self.rows = {}
+        self._ids = iter(range(1, 10**6))
+
+    def queue_outbound(self, recipient, body, error, retry_at):
+        now = datetime.now(ZoneInfo("Asia/Jakarta"))
+        self.rows[next(self._ids)] = [recipient, body, 0, now, retry_at]
+
+    def pending_outbound(self, limit=500):
+        return [(i, *row) for i, row in sorted(self.rows.items())][:limit]
+
+    def has_outbound(self, recipient):
+        return any(row[0] == recipient for row in self.rows.values())
+
+    def defer_outbound(self, message_id, error, retry_at):
+        self.rows[message_id][2] += 1
+        self.rows[message_id][4] = retry_at
+
+    def delete_outbound(self, message_id):
+        self.rows.pop(message_id, None)
+
+    def due_now(self):
+        past = datetime.now(ZoneInfo("Asia/Jakarta")) - timedelta(seconds=1)
+        for row in self.rows.values():
+            row[4] = past
+
+
+def _dispatcher(client, store=None, **options):
+    options.setdefault("rate", 0)
+    options.setdefault("recipient_rate", 0)
+    options.setdefault("coalesce_window", 0.05)
+    return OutboundDispatcher(client, lambda recipient, body: (recipient, body), store=store, **options)
+
+
+def test_texts_within_the_window_are_coalesced():
+    client = FakeClient()
+    dispatcher = _dispatcher(client, MemoryStore())
+    dispatcher.start()
+    for text in ("satu", "dua", "tiga"):
+        dispatcher.send("62a", text)
+    dispatcher.stop()
+
+    assert client.sent == [("62a", SEPARATOR.join(["satu", "dua", "tiga"]))]
+
+
+def test_coalescing_respects_the_body_limit():
+    client = FakeClient()
+    dispatcher = _dispatcher(client, MemoryStore())
+    dispatcher.start()
+    texts = ["a" * (MAX_TEXT_LENGTH - 10), "b" * 20, "c"]
+    for text in texts:
+        dispatcher.send("62a", text)
+    dispatcher.stop()
+
+    assert client.sent == [("62a", texts[0]), ("62a", texts[1] + SEPARATOR + texts[2])]
+
+
+def test_stop_sends_or_persists_every_reply():
+    client = FakeClient(delay=0.2)
+    store = MemoryStore()
+    dispatcher = _dispatcher(client, store, workers=1, coalesce_window=0)
+    dispatcher.start()
+    for i in range(3):
+        dispatcher.send(f"62{i}", f"balasan {i}")
+    started = time.monotonic()
+    dispatcher.stop(timeout=0.3)
+
+    assert time.monotonic() - started < 2
+    sent = {body for _, body in client.sent}
+    persisted = {row[1] for row in store.rows.values()}
+    assert sent | persisted == {"balasan 0", "balasan 1", "balasan 2"}
+
+
+def test_stop_persists_into_outbound_messages(manager):
+    recipient = f"test-{uuid.uuid4().hex[:12]}"
+    dispatcher = _dispatcher(FakeClient(failures=[_http_error(503)] * 3), manager, coalesce_window=0)
+    dispatcher.start()
+    for i in range(3):
+        dispatcher.send(recipient, f"balasan {i}")
+    dispatcher.stop()
+
+    try:
+        bodies = [body for _, to, body, *_ in manager.pending_outbound() if to == recipient]
+        assert bodies == [SEPARATOR.join(f"balasan {i}" for i in range(3))]
+        assert manager.has_outbound(recipient)
+    finally:
+        for message_id, to, *_ in manager.pending_outbound():
+            if to == recipient:
+                manager.delete_outbound(message_id)
+
+
+EXIT_CHILD = r"""
+import atexit, json, sys, threading, time
+sys.path.insert(0, sys.argv[1])
+from tests.test_outbound import FakeClient, MemoryStore, _dispatcher
+
+client, store = FakeClient(delay=0.05), MemoryStore()
+dispatcher = _dispatcher(client, store, coalesce_window=0.2)
+# registered first so it runs last, after stop(), like a report of what survived
+atexit.register(lambda: print(json.dumps({"sent": len(client.sent), "persisted": len(store.rows)})))
+atexit.register(dispatcher.stop)
+dispatcher.start()
+for i in range(3):
+    dispatcher.send(f"62{i}", f"balasan {i}")
+"""
+
+
+def test_replies_queued_at_exit_are_flushed():
+    # the interpreter shuts down concurrent.futures pools before atexit hooks run;
+    # the dispatcher's own sender threads must still be there for stop()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", EXIT_CHILD, root], capture_output=True, text=True, timeout=30)
+
+    assert time.monotonic() - started < 5
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == {"sent": 3, "persisted": 0}
+
+
+def test_failed_send_is_retried_in_order():
+    client = FakeClient(failures=[_http_error(503), None, None])
+    store = MemoryStore()
+    dispatcher = _dispatcher(client, store)
+
+    dispatcher.send("62a", "pertama")
+    assert client.sent == [] and len(store.rows) == 1
+    # inline mode: a newer reply must not overtake the persisted one
+    dispatcher.send("62a", "kedua")
+    dispatcher.send("62b", "lain")
+    assert client.sent == [("62b", "lain")]
+
+    store.due_now()
+    dispatcher.retry_pending()
+
+    assert client.sent == [("62b", "lain"), ("62a", "pertama"), ("62a", "kedua")]
+    assert store.rows == {}
+
+
+def test_backlogged_recipient_queues_behind_persisted_messages():
+    client = FakeClient()
+    store = MemoryStore()
+    store.queue_outbound("62a", "lama", "HTTP 503", datetime.now(ZoneInfo("Asia/Jakarta")) + timedelta(hours=1))
+    dispatcher = _dispatcher(client, store)
+    dispatcher.start()
+    dispatcher.send("62a", "baru")
+    dispatcher.send("62b", "lain")
+    dispatcher.stop()
+
+    assert client.sent == [("62b", "lain")]
+    assert [row[1] for _, row in sorted(store.rows.items())] == ["lama", "baru"]
+
+
+def test_client_errors_are_dropped():
+    client = FakeClient(failures=[_http_error(400)])
+    store = MemoryStore()
+    _dispatcher(client, store).send("62a", "rusak")
+
+    assert client.sent == [] and store.rows == {}
+
+
+@pytest.mark.parametrize("retry_after, pause", [("2", 2.0), ("1.5", 1.5), ("soon", 30.0), (None, 30.0)])
+def test_retry_after_pauses_sending(retry_after, pause):
+    dispatcher = _dispatcher(FakeClient(), rate=10, burst=10, retry_base=30.0)
+
+    assert dispatcher._failure(429, retry_after) == ("HTTP 429", True)
+    assert dispatcher._global.wait_time(time.monotonic()) == pytest.approx(pause, abs=0.05)
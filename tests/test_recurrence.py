@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from app.utils.recurrence import describe, next_occurrence, occurrences
+
+JAKARTA = ZoneInfo("Asia/Jakarta")
+
+
+def at(year, month, day, hour=9):
+    return datetime(year, month, day, hour, tzinfo=JAKARTA)
+
+
+def test_monthly_on_the_31st_skips_short_months():
+    found = list(occurrences(at(2027, 1, 31), "monthly", None, at(2027, 1, 1), at(2028, 1, 1)))
+
+    assert [d.month for d in found] == [1, 3, 5, 7, 8, 10, 12]
+    assert all(d.day == 31 and d.hour == 9 for d in found)
+
+
+def test_monthly_on_the_29th_keeps_leap_february():
+    found = list(occurrences(at(2027, 1, 29), "monthly", None, at(2027, 1, 1), at(2028, 4, 1)))
+
+    assert [(d.year, d.month) for d in found if d.month == 2] == [(2028, 2)]
+    assert len(found) == 14  # every month from January 2027 to March 2028 but February 2027
+
+
+def test_rule_starting_on_feb_29():
+    start = at(2028, 2, 29)
+
+    assert next_occurrence(start, "monthly", start) == at(2028, 3, 29)
+    # no February 29 in 2029: the search runs on to March
+    assert next_occurrence(start, "monthly", at(2029, 1, 30)) == at(2029, 3, 29)
+    assert next_occurrence(start, "weekly", start) == at(2028, 3, 7)
+    assert describe("monthly", start) == "setiap tanggal 29"
+
+
+def test_daily_and_weekly_across_leap_day():
+    days = list(occurrences(at(2028, 2, 27), "daily", None, at(2028, 2, 28, 0), at(2028, 3, 2, 0)))
+    weeks = list(occurrences(at(2028, 2, 22), "weekly", None, at(2028, 2, 1), at(2028, 3, 15)))
+
+    assert [(d.month, d.day) for d in days] == [(2, 28), (2, 29), (3, 1)]
+    assert [(d.month, d.day) for d in weeks] == [(2, 22), (2, 29), (3, 7), (3, 14)]
+
+
+def test_month_end_rule_ends_at_until():
+    until = at(2027, 5, 31, 0) + timedelta(days=1) - timedelta(microseconds=1)
+
+    assert [d.month for d in occurrences(at(2027, 1, 31), "monthly", until, at(2027, 1, 1), at(2028, 1, 1))] == [1, 3, 5]
+    assert next_occurrence(at(2027, 1, 31), "monthly", at(2027, 5, 31), until) is None
+
+
+def test_far_after_start_jumps_to_the_period():
+    start = at(2000, 1, 31)
+
+    assert next_occurrence(start, "monthly", at(2100, 2, 1)) == at(2100, 3, 31)
+    assert next_occurrence(start, "monthly", at(2100, 3, 31), inclusive=True) == at(2100, 3, 31)
@@ -0,0 +1,106 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.utils.schedule_import import UNSUPPORTED_DOCUMENT, document_kind, parse_csv, parse_document, parse_ics
+
+JAKARTA = ZoneInfo("Asia/Jakarta")
+
+
+def build(time, date, month, activity, year=None):
+    # what ScheduleManager.build_schedule receives, without the date checks
+    if time == "25:00":
+        raise ValueError("Time must be in HH:MM format (e.g., 09:30)")
+    return activity, (time, date, month, year)
+
+
+def test_csv_with_header():
+    text = "Kegiatan,Jam,Tanggal,Bulan\nRapat Tim,09:30,12,Januari\nmakan,12:00,13,\n"
+
+    assert parse_csv(text, build) == (
+        [("rapat tim", ("09:30", "12", "januari", None)), ("makan", ("12:00", "13", None, None))],
+        [],
+    )
+
+
+def test_csv_without_header_and_iso_dates():
+    text = "rapat,09:30,2027-01-12\nsenam,06:00,5,3,2027\n"
+
+    assert parse_csv(text, build) == (
+        [("rapat", ("09:30", "12", "01", 2027)), ("senam", ("06:00", "5", "3", 2027))],
+        [],
+    )
+
+
+def test_csv_row_errors_name_the_line():
+    text = "activity,time,date\nrapat,,12\n,,\nmakan,25:00,12\nsenam,06:00,12\n"
+    entries, errors = parse_csv(text, build)
+
+    assert entries == [("senam", ("06:00", "12", None, None))]
+    assert errors == ["baris 2: aktivitas dan jam wajib diisi", "baris 4: Time must be in HH:MM format (e.g., 09:30)"]
+
+
+ICS = "\r\n".join([
+    "BEGIN:VCALENDAR",
+    "BEGIN:VEVENT",
+    "SUMMARY:Rapat\\, tim",
+    "DTSTART;TZID=Asia/Jakarta:20270112T093000",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Panggilan de",
+    " ngan klien",
+    "DTSTART:20270112T020000Z",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Libur",
+    "DTSTART;VALUE=DATE:20270113",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "DTSTART:20270114T090000",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Rusak",
+    "DTSTART:kemarin",
+    "END:VEVENT",
+    "END:VCALENDAR",
+])
+
+
+def test_ics_events():
+    entries, errors = parse_ics(ICS)
+
+    assert entries == [
+        ("rapat, tim", datetime(2027, 1, 12, 9, 30, tzinfo=JAKARTA)),
+        # UTC and folded lines
+        ("panggilan dengan klien", datetime(2027, 1, 12, 9, 0, tzinfo=JAKARTA)),
+        ("libur", datetime(2027, 1, 13, tzinfo=JAKARTA)),
+    ]
+    assert errors == ["acara tanpa SUMMARY dilewati", "Rusak: DTSTART tidak dikenali (kemarin)"]
+
+
+def test_ics_other_timezone_is_converted():
+    text = "BEGIN:VEVENT\nSUMMARY:Rapat\nDTSTART;TZID=Europe/London:20270112T090000\nEND:VEVENT\n"
+
+    assert parse_ics(text) == ([("rapat", datetime(2027, 1, 12, 16, 0, tzinfo=JAKARTA))], [])
+
+
+@pytest.mark.parametrize("filename, mime_type, kind", [
+    ("agenda.ICS", None, "ics"),
+    ("agenda", "text/calendar", "ics"),
+    ("agenda.csv", "application/octet-stream", "csv"),
+    ("agenda", "text/csv", "csv"),
+    ("agenda.pdf", "application/pdf", None),
+    (None, None, None),
+])
+def test_document_kind(filename, mime_type, kind):
+    assert document_kind(filename, mime_type) == kind
+
+
+def test_parse_document():
+    # Excel writes a byte order mark at the start
+    content = "\ufeffactivity,time,date\nrapat,09:30,12\n".encode("utf-8")
+
+    assert parse_document("agenda.csv", "text/csv", content, build) == ([("rapat", ("09:30", "12", None, None))], [])
+    with pytest.raises(ValueError, match=UNSUPPORTED_DOCUMENT):
+        parse_document("agenda.pdf", "application/pdf", b"%PDF", build)
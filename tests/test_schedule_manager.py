@@ -0,0 +1,305 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.database import DuplicateScheduleError, ScheduleManager
+from app.utils.dedup import MessageDeduplicator
+
+JAKARTA = ZoneInfo("Asia/Jakarta")
+
+
+def _now():
+    return datetime.now(JAKARTA)
+
+
+def _month(manager, when):
+    return manager._month_names[when.month]
+
+
+def _add_at(manager, owner, activity, when):
+    return manager.add_schedule(when.strftime("%H:%M"), when.day, _month(manager, when), activity, when.year, owner=owner)
+
+
+def _this_month(hour, day=10):
+    # rename and date shift look the schedule up in the current year, so tests use a fixed day of this month
+    now = _now()
+    return now.replace(day=day, hour=hour, minute=0, second=0, microsecond=0)
+
+
+def _schedule_id(manager, owner, activity):
+    with manager.storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM schedules WHERE owner_waid = %s AND activity = %s", (owner, activity))
+        return cursor.fetchone()[0]
+
+
+def test_add_schedule(manager, owner):
+    when = datetime(_now().year + 1, 3, 14, 9, 30, tzinfo=JAKARTA)
+    reply = _add_at(manager, owner, "rapat", when)
+
+    assert reply == "Jadwal 'rapat' berhasil ditambahkan pada 14 maret, pukul 09:30"
+    assert manager.get_range(when, when + timedelta(minutes=1), owner) == [("09:30", "rapat", 14, "maret")]
+
+
+def test_add_duplicate_is_rejected(manager, owner):
+    when = datetime(_now().year + 1, 3, 14, 9, 30, tzinfo=JAKARTA)
+    _add_at(manager, owner, "rapat", when)
+
+    with pytest.raises(DuplicateScheduleError):
+        _add_at(manager, owner, "rapat", when)
+    # same name at another time, or for another owner, is a different schedule
+    _add_at(manager, owner, "rapat", when + timedelta(hours=1))
+    _add_at(manager, f"{owner}-other", "rapat", when)
+
+    assert len(manager.get_range(when, when + timedelta(days=1), owner)) == 2
+
+
+def test_add_schedules_reports_duplicates(manager, owner):
+    when = datetime(_now().year + 1, 3, 14, 9, 30, tzinfo=JAKARTA)
+    _add_at(manager, owner, "rapat", when)
+
+    added, duplicates = manager.add_schedules(
+        [("rapat", when), ("makan", when), ("makan", when)], owner=owner
+    )
+
+    assert added == [("makan", when)]
+    assert sorted(duplicates) == [("makan", when), ("rapat", when)]
+
+
+def test_range_queries(manager, owner):
+    start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+    _add_at(manager, owner, "c", start + timedelta(days=2, hours=8))
+    _add_at(manager, owner, "a", start + timedelta(hours=9))
+    _add_at(manager, owner, "b", start + timedelta(hours=7))
+    _add_at(manager, owner, "outside", start + timedelta(days=7))
+
+    week = manager.get_range(start, start + timedelta(days=7), owner)
+
+    assert week == [("07:00", "b", 14, "maret"), ("09:00", "a", 14, "maret"), ("08:00", "c", 16, "maret")]
+    assert list(manager.iter_range(start, start + timedelta(days=7), owner, batch_size=1)) == week
+    assert manager.get_range(start, start + timedelta(days=7), f"{owner}-other") == []
+
+
+def test_range_is_invalidated_by_writes(manager, owner):
+    start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+    assert manager.get_range(start, start + timedelta(days=1), owner) == []
+
+    _add_at(manager, owner, "rapat", start + timedelta(hours=9))
+
+    assert manager.get_range(start, start + timedelta(days=1), owner) == [("09:00", "rapat", 14, "maret")]
+
+
+def test_rename(manager, owner):
+    when = _this_month(9)
+    month = _month(manager, when)
+    _add_at(manager, owner, "rapat", when)
+    _add_at(manager, owner, "makan", when)
+
+    assert manager.update_activity_name("rapat", when.day, month, "rapat tim", owner=owner)
+    assert not manager.update_activity_name("tidak ada", when.day, month, "x", owner=owner)
+    with pytest.raises(DuplicateScheduleError):
+        manager.update_activity_name("rapat tim", when.day, month, "makan", owner=owner)
+
+    day = when.replace(hour=0)
+    assert sorted(row[1] for row in manager.get_range(day, day + timedelta(days=1), owner)) == ["makan", "rapat tim"]
+
+
+def test_date_shift(manager, owner):
+    when = _this_month(9)
+    month = _month(manager, when)
+    _add_at(manager, owner, "rapat", when)
+
+    assert manager.update_schedule_time("rapat", when.day, 12, month, owner=owner)
+    assert not manager.update_schedule_time("rapat", when.day, 12, month, owner=owner)
+
+    day = when.replace(day=12, hour=0)
+    assert manager.get_range(day, day + timedelta(days=1), owner) == [("09:00", "rapat", 12, month)]
+    assert manager.get_range(when.replace(hour=0), day, owner) == []
+
+
+def test_date_shift_onto_duplicate(manager, owner):
+    when = _this_month(9)
+    month = _month(manager, when)
+    _add_at(manager, owner, "rapat", when)
+    _add_at(manager, owner, "rapat", when.replace(day=12))
+
+    with pytest.raises(DuplicateScheduleError):
+        manager.update_schedule_time("rapat", when.day, 12, month, owner=owner)
+
+
+def test_remove(manager, owner):
+    when = _this_month(9)
+    month = _month(manager, when)
+    _add_at(manager, owner, "rapat", when)
+
+    assert manager.remove_activity("rapat", when.day, month, owner=owner)
+    assert not manager.remove_activity("rapat", when.day, month, owner=owner)
+
+
+def test_reminder_claimed_once(manager, owner):
+    now = _now()
+    when = (now + timedelta(minutes=10)).replace(second=0, microsecond=0)
+    _add_at(manager, owner, "rapat", when)
+    schedule_id = _schedule_id(manager, owner, "rapat")
+
+    assert (schedule_id, when) in [tuple(row) for row in manager.get_pending_reminders(now, now + timedelta(hours=1))]
+
+    until = now + timedelta(minutes=35)
+    assert manager.claim_reminders([schedule_id], until) == [
+        {"activity": "rapat", "time": when.strftime("%H:%M"), "owner": owner}
+    ]
+    assert manager.claim_reminders([schedule_id], until) == []
+    assert schedule_id not in [i for i, _ in manager.get_pending_reminders(now, now + timedelta(hours=1))]
+
+
+def test_reminder_not_claimed_early(manager, owner):
+    now = _now()
+    _add_at(manager, owner, "rapat", (now + timedelta(hours=2)).replace(second=0, microsecond=0))
+    schedule_id = _schedule_id(manager, owner, "rapat")
+
+    assert manager.claim_reminders([schedule_id], now + timedelta(minutes=35)) == []
+
+
+def test_batch_transaction_commits_once(manager, owner):
+    start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+    with manager.transaction():
+        _add_at(manager, owner, "a", start + timedelta(hours=9))
+        _add_at(manager, owner, "b", start + timedelta(hours=10))
+        # reads inside the batch see its own uncommitted writes
+        assert len(manager.get_range(start, start + timedelta(days=1), owner)) == 2
+
+    assert [row[1] for row in manager.get_range(start, start + timedelta(days=1), owner)] == ["a", "b"]
+
+
+def test_batch_transaction_survives_failed_command(manager, owner):
+    start = _this_month(0)
+    with manager.transaction():
+        _add_at(manager, owner, "a", start + timedelta(hours=9))
+        with pytest.raises(DuplicateScheduleError):
+            _add_at(manager, owner, "a", start + timedelta(hours=9))
+        with pytest.raises(ValueError):
+            manager.add_schedule("09:00", 32, _month(manager, start), "b", start.year, owner=owner)
+        _add_at(manager, owner, "b", start + timedelta(hours=9))
+        # fails in the database on the unique index; only that statement is rolled back
+        with pytest.raises(DuplicateScheduleError):
+            manager.update_activity_name("b", start.day, _month(manager, start), "a", owner=owner)
+        _add_at(manager, owner, "c", start + timedelta(hours=10))
+
+    assert [row[1] for row in manager.get_range(start, start + timedelta(days=1), owner)] == ["a", "b", "c"]
+
+
+def test_batch_transaction_rolls_back_on_error(manager, owner):
+    start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            _add_at(manager, owner, "a", start + timedelta(hours=9))
+            raise RuntimeError("abort")
+
+    assert manager.get_range(start, start + timedelta(days=1), owner) == []
+
+
+def test_dedup_claims_are_shared(manager):
+    message_id = f"wamid.test-{uuid.uuid4().hex}"
+    first, second = MessageDeduplicator(store=manager), MessageDeduplicator(store=manager)
+    try:
+        assert not first.is_duplicate(message_id)
+        assert first.is_duplicate(message_id)
+        # another worker sees the claim through the database
+        assert second.is_duplicate(message_id)
+
+        first.forget(message_id)
+        assert not MessageDeduplicator(store=manager).is_duplicate(message_id)
+    finally:
+        manager.release_message(message_id)
+
+
+def test_expired_schedules_are_archived(manager, owner):
+    past = (_now() - timedelta(days=3)).replace(second=0, microsecond=0)
+    future = datetime(_now().year + 1, 3, 14, 9, tzinfo=JAKARTA)
+    for hour in range(5):
+        _add_at(manager, owner, f"lama {hour}", past.replace(hour=hour))
+    _add_at(manager, owner, "baru", future)
+
+    # EXPIRY_BATCH_SIZE is 2, so this takes several batches
+    assert manager.clean_outdated_activities(force=True) >= 5
+
+    assert manager.get_range(past.replace(hour=0), past.replace(hour=0) + timedelta(days=1), owner) == []
+    assert manager.get_range(future, future + timedelta(hours=1), owner) == [("09:00", "baru", 14, "maret")]
+    assert manager.expiry_watermark() >= past
+    with manager.storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT activity FROM schedules_archive WHERE owner_waid = %s ORDER BY scheduled_at", (owner,))
+        assert [row[0] for row in cursor.fetchall()] == [f"lama {hour}" for hour in range(5)]
+
+
+def test_expiry_waits_for_interval(manager, owner):
+    manager.clean_outdated_activities(force=True)
+    _add_at(manager, owner, "lama", (_now() - timedelta(days=1)).replace(second=0, microsecond=0))
+
+    assert manager.clean_outdated_activities() == 0
+    assert manager.clean_outdated_activities(force=True) >= 1
+
+
+def test_sqlite_reads_do_not_wait_for_a_writer(manager, owner):
+    if manager.storage.name != "sqlite":
+        pytest.skip("SQLite locking")
+    start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+    _add_at(manager, owner, "a", start + timedelta(hours=9))
+
+    with manager.storage.connection() as writer:
+        manager.storage.begin(writer)
+        writer.cursor().execute("DELETE FROM schedules WHERE owner_waid = %s", (owner,))
+        began = time.monotonic()
+        with manager.transaction(write=False):
+            # WAL readers see the last commit without waiting for the open write
+            assert [row[1] for row in manager.get_range(start, start + timedelta(days=1), owner)] == ["a"]
+        assert time.monotonic() - began < 1
+
+        # a writer waits on busy_timeout for the lock instead of failing
+        threading.Timer(0.2, writer.commit).start()
+        _add_at(manager, owner, "b", start + timedelta(hours=10))
+
+    assert [row[1] for row in manager.get_range(start, start + timedelta(days=1), owner)] == ["b"]
+
+
+def test_cache_off_sees_writes_of_other_processes(manager, owner, monkeypatch):
+    monkeypatch.setenv("CACHE_TTL", "0")
+    reader, writer = ScheduleManager(), ScheduleManager()
+    try:
+        start = datetime(_now().year + 1, 3, 14, tzinfo=JAKARTA)
+        assert reader.get_range(start, start + timedelta(days=1), owner) == []
+
+        _add_at(writer, owner, "rapat", start + timedelta(hours=9))
+
+        assert reader.get_range(start, start + timedelta(days=1), owner) == [("09:00", "rapat", 14, "maret")]
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_ended_recurring_schedules_are_deleted(manager, owner):
+    past = (_now() - timedelta(days=30)).replace(second=0, microsecond=0)
+    with manager.storage.connection() as conn:
+        cursor = conn.cursor()
+        for i in range(3):
+            cursor.execute(
+                "INSERT INTO recurring_schedules (owner_waid, activity, frequency, starts_at, until_at) VALUES (%s, %s, %s, %s, %s)",
+                (owner, f"selesai {i}", "daily", past, past + timedelta(days=i + 1)),
+            )
+        conn.commit()
+    manager.add_recurring("09:00", "hari", "senam", owner=owner)
+
+    # EXPIRY_BATCH_SIZE is 2, so this takes several batches
+    assert manager.clean_outdated_activities(force=True) >= 3
+
+    assert [rule[0] for rule in manager.get_recurring(owner)] == ["senam"]
+    with manager.storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT activity FROM recurring_schedules WHERE owner_waid = %s", (owner,))
+        assert [row[0] for row in cursor.fetchall()] == ["senam"]
+    # the name of an ended rule can be used again
+    manager.add_recurring("10:00", "hari", "selesai 0", owner=owner)
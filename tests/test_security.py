@@ -0,0 +1,57 @@
+import hashlib
+import hmac
+
+import pytest
+from flask import Flask
+
+from app.config import load_configurations
+from app.decorators.security import SignatureVerifier
+
+BODY = b'{"object": "whatsapp_business_account", "entry": []}'
+
+
+def sign(secret, body=BODY):
+    return "sha256=" + hmac.new(secret.encode("latin-1"), body, hashlib.sha256).hexdigest()
+
+
+def test_old_and_new_secret_accepted_while_rotating():
+    verifier = SignatureVerifier(["baru", "lama"])
+
+    assert verifier.validate(BODY, sign("baru"))
+    assert verifier.validate(BODY, sign("lama"))
+    assert not verifier.validate(BODY, sign("lain"))
+    # the cached HMAC state is copied, never consumed, by a check
+    assert verifier.validate(BODY, sign("baru"))
+
+
+def test_old_secret_rejected_after_rotation():
+    verifier = SignatureVerifier(["baru", None, ""])
+
+    assert verifier.validate(BODY, sign("baru"))
+    assert not verifier.validate(BODY, sign("lama"))
+
+
+def test_signature_covers_the_body():
+    verifier = SignatureVerifier(["baru"])
+
+    assert not verifier.validate(BODY + b" ", sign("baru"))
+
+
+@pytest.mark.parametrize("header", ["", "sha1=abcd", "sha256=not-hex", sign("baru")[len("sha256="):]])
+def test_malformed_headers_rejected(header):
+    assert not SignatureVerifier(["baru"]).validate(BODY, header)
+
+
+def test_no_secret_rejects_everything():
+    assert not SignatureVerifier([None]).validate(BODY, sign(""))
+
+
+def test_previous_secrets_come_from_config(monkeypatch):
+    monkeypatch.setenv("APP_SECRET", "baru")
+    monkeypatch.setenv("APP_SECRET_PREVIOUS", "lama, lebih lama,")
+    app = Flask(__name__)
+    load_configurations(app)
+    verifier = SignatureVerifier(app.config["APP_SECRETS"])
+
+    assert app.config["APP_SECRETS"] == ["baru", "lama", "lebih lama"]
+    assert verifier.validate(BODY, sign("lebih lama"))
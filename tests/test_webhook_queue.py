@@ -0,0 +1,19 @@
+import pytest
+from flask import Flask
+
+from app.config import load_configurations
+from app.utils.webhook_queue import WebhookWorkerPool
+
+
+def test_pool_needs_a_worker():
+    with pytest.raises(ValueError):
+        WebhookWorkerPool(Flask(__name__), lambda body: None, workers=0)
+
+
+def test_no_workers_processes_inline(monkeypatch):
+    monkeypatch.setenv("WEBHOOK_ASYNC", "true")
+    monkeypatch.setenv("WEBHOOK_WORKERS", "0")
+    app = Flask(__name__)
+    load_configurations(app)
+
+    assert app.config["WEBHOOK_ASYNC"] is False
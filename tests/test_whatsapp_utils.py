@@ -0,0 +1,48 @@
+import pytest
+
+from app.utils.whatsapp_utils import format_grouped_schedules, pack_messages
+
+
+def test_blocks_share_a_message_when_they_fit():
+    blocks = [("A:", "A+:", ["a1", "a2"]), ("B:", "B+:", ["b1"])]
+
+    assert pack_messages("T", blocks, limit=40) == ["T\n\nA:\na1\na2\n\nB:\nb1"]
+
+
+def test_messages_break_between_days():
+    blocks = [("A:", "A+:", ["a1", "a2"]), ("B:", "B+:", ["b1"])]
+
+    assert pack_messages("T", blocks, limit=14) == ["T\n\nA:\na1\na2", "B:\nb1"]
+
+
+def test_long_day_continues_under_its_header():
+    blocks = [("A:", "A+:", ["line 1", "line 2", "line 3"])]
+
+    assert pack_messages(None, blocks, limit=16) == ["A:\nline 1\nline 2", "A+:\nline 3"]
+
+
+def test_line_longer_than_a_message_is_cut():
+    line = "x" * 25
+    messages = pack_messages(None, [("A:", "A+:", [line])], limit=12)
+
+    assert messages == ["A:\nxxxxxxxx", "A+:\nxxxxxxxx", "A+:\nxxxxxxxx", "A+:\nx"]
+    assert "".join(message.split("\n", 1)[1] for message in messages) == line
+
+
+@pytest.mark.parametrize("limit", [40, 60, 200])
+def test_no_message_exceeds_the_limit(limit):
+    rows = [(f"{hour:02d}:00", f"kegiatan {'panjang ' * hour}{hour}", day, "maret") for day in (1, 2, 3) for hour in range(8)]
+    days = (
+        (f"{date} {month}:", f"{date} {month} (lanjutan):", [f"{time} - {activity}" for time, activity, d, _ in rows if d == date])
+        for date, month in [(1, "maret"), (2, "maret"), (3, "maret")]
+    )
+    messages = pack_messages("Jadwal:", days, limit=limit)
+
+    assert all(len(message) <= limit for message in messages)
+    assert messages[0].startswith("Jadwal:\n\n1 maret:")
+
+
+def test_nothing_to_pack():
+    assert pack_messages("T", []) == []
+    assert pack_messages("T", [("A:", "A+:", [])]) == []
+    assert format_grouped_schedules("Jadwal minggu ini:", iter([])) == []